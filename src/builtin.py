@@ -1,9 +1,10 @@
 from .parser import *
 
 
-BoolType = NamedType("Bool")
-IntType = NamedType("Int")
-StringType = NamedType("String")
+# 与 parser 解析出的同名类型是同一个实例，type checker 中可以用 is 比较
+BoolType = intern_named_type("Bool")
+IntType = intern_named_type("Int")
+StringType = intern_named_type("String")
 TypeType = "*"
 
 
@@ -11,13 +12,17 @@ def is_built_in_type(type: NamedType):
     return type.name in ("Bool", "Int", "String")
 
 
+# 内置函数的类型直接由共享实例构造，与 type solver 解出的类型共用实例
+_A = intern_named_type("a")
+_ListA = intern_type(ListType(_A))
+
 built_in_funcs = {
     "print": (
-        ArrowType(StringType, StringType),
+        intern_type(ArrowType(StringType, StringType)),
         NamedExpr("print", is_builtin=True),
     ),
     "println": (
-        ArrowType(StringType, StringType),
+        intern_type(ArrowType(StringType, StringType)),
         NamedExpr("println", is_builtin=True),
     ),
     "read": (
@@ -25,33 +30,31 @@ built_in_funcs = {
         NamedExpr("read", is_builtin=True),
     ),
     "string_to_int": (
-        ArrowType(StringType, IntType),
+        intern_type(ArrowType(StringType, IntType)),
         NamedExpr("read_int", is_builtin=True),
     ),
     "int_to_string": (
-        ArrowType(IntType, StringType),
+        intern_type(ArrowType(IntType, StringType)),
         NamedExpr("int_to_string", is_builtin=True),
     ),
     # forall a. [a] -> a
     "head": (
-        ForAllType("a", ArrowType(ListType(NamedType("a")), NamedType("a")), trait_bounds=[]),
+        intern_type(ForAllType("a", intern_type(ArrowType(_ListA, _A)), trait_bounds=[])),
         NamedExpr("head", is_builtin=True),
     ),
     # forall a. [a] -> [a]
     "tail": (
-        ForAllType(
-            "a", ArrowType(ListType(NamedType("a")), ListType(NamedType("a"))), trait_bounds=[]
-        ),
+        intern_type(ForAllType("a", intern_type(ArrowType(_ListA, _ListA)), trait_bounds=[])),
         NamedExpr("tail", is_builtin=True),
     ),
     # forall a. a -> [a] -> [a]
     "cons": (
-        ForAllType(
-            "a",
-            ArrowType(
-                NamedType("a"), ArrowType(ListType(NamedType("a")), ListType(NamedType("a")))
-            ),
-            trait_bounds=[],
+        intern_type(
+            ForAllType(
+                "a",
+                intern_type(ArrowType(_A, intern_type(ArrowType(_ListA, _ListA)))),
+                trait_bounds=[],
+            )
         ),
         NamedExpr("cons", is_builtin=True),
     ),
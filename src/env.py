@@ -1,15 +1,51 @@
+from collections import Counter
+
+
 class Env:
-    def __init__(self, outer=None):
-        self.vars = {}
-        self.outer = outer
+    """
+    扁平的作用域：name |-> 由内到外的值栈，每层作用域记录自己绑定的名字
+    查找只看栈顶，不需要沿着 outer 链逐层查找
+    """
+
+    __slots__ = ("vars", "frames")
+
+    def __init__(self):
+        self.vars: dict[str, list] = {}  # name |-> stack of values, innermost last
+        self.frames: list[set[str]] = [set()]
 
     def get(self, name: str):
-        if name in self.vars:
-            return self.vars[name]
-        elif self.outer:
-            return self.outer.get(name)
-        else:
+        stack = self.vars.get(name)
+        if not stack:
             raise NameError(f"Unbound variable '{name}'")
+        return stack[-1]
 
     def set(self, name: str, value):
-        self.vars[name] = value
+        frame = self.frames[-1]
+        if name in frame:
+            self.vars[name][-1] = value
+        else:
+            frame.add(name)
+            self.vars.setdefault(name, []).append(value)
+
+    def push_frame(self):
+        self.frames.append(set())
+
+    def pop_frame(self):
+        for name in self.frames.pop():
+            stack = self.vars[name]
+            stack.pop()
+            if not stack:
+                del self.vars[name]
+
+
+class BoundNames(Counter):
+    """name |-> 当前被绑定的层数，代替逐项扫描的名字栈"""
+
+    def bind(self, name: str):
+        self[name] += 1
+
+    def unbind(self, name: str):
+        if self[name] == 1:
+            del self[name]
+        else:
+            self[name] -= 1
@@ -2,7 +2,8 @@ from typing import NoReturn
 from dataclasses import replace
 
 from .parser import *
-from .visitor import NodeVisitor, TransformVisitor
+from .visitor import NodeVisitor, TransformVisitor, iter_fields
+from .env import BoundNames
 
 
 """
@@ -14,26 +15,36 @@ class InterpreterVisitor(NodeVisitor):
     def __init__(self):
         super().__init__()
         self.global_var_dict = {}  # name |-> value
-        self.bounded_var_names = []  # stack
+        self.bounded_var_names = BoundNames()
 
-        self.stmt_eval_info = []  # [(lineno, info)]
         self.cur_lineno = None
 
-        with open("step5_eval.rs", "w", encoding="utf-8"):
-            pass
+        # 与 type checker 相同：step5_eval.rs 在求值结束（或出错）时一次写出
+        # 记录 (stmt, result)，写出时才格式化
+        self._log_entries: list[tuple[Stmt, Expr]] = []
 
     def _error(self, msg: str) -> NoReturn:
         raise ValueError(f"[Line {self.cur_lineno}] Runtime Error: {msg}")
 
     def _log(self, stmt, result):
-        with open("step5_eval.rs", "a", encoding="utf-8") as f:
-            if result is not None:
-                f.write(f"{stmt}  // ==> {result}\n")
-            else:
-                f.write(f"{stmt}\n")
+        self._log_entries.append((stmt, result))
+
+    def _flush_log(self):
+        with open("step5_eval.rs", "w", encoding="utf-8") as f:
+            for stmt, result in self._log_entries:
+                if result is not None:
+                    f.write(f"{stmt}  // ==> {result}\n")
+                else:
+                    f.write(f"{stmt}\n")
 
     ###############################################################
 
+    def visit_Program(self, node: Program):
+        try:
+            self.generic_visit(node)
+        finally:
+            self._flush_log()
+
     def visit_AssignStmt(self, node: AssignStmt):
         self.cur_lineno = node.lineno
         stmt_eval = self.visit(node.expr)
@@ -46,10 +57,10 @@ class InterpreterVisitor(NodeVisitor):
         self._log(node, eval)
 
     def visit_LambdaExpr(self, node: LambdaExpr):
-        self.bounded_var_names.append(node.param_name)
+        self.bounded_var_names.bind(node.param_name)
         # Type annotation erasure + lazy eval
         eval = replace(node, body=node.body, param_type=None)
-        self.bounded_var_names.pop()
+        self.bounded_var_names.unbind(node.param_name)
         return eval
 
     def visit_TypeLambdaExpr(self, node: TypeLambdaExpr):
@@ -232,7 +243,7 @@ class InterpreterVisitor(NodeVisitor):
     def visit_FieldAccessExpr(self, node: FieldAccessExpr):
         record_eval = self.visit(node.record)
         if isinstance(record_eval, RecordExpr):
-            return self.visit(record_eval.fields[node.field_name])
+            return self.visit(record_eval.get_field(node.field_name))
 
         return replace(node, record=record_eval)
 
@@ -276,7 +287,7 @@ class InterpreterVisitor(NodeVisitor):
     def visit_RecordExpr(self, node: RecordExpr):
         return replace(
             node,
-            fields={l: self.visit(v) for l, v in node.fields.items()},
+            fields=tuple((l, self.visit(v)) for l, v in node.fields),
         )
 
 
@@ -310,6 +321,15 @@ class _TermSubstitutionVisitor(TransformVisitor):
         assert isinstance(old, NamedExpr)
         self.old = old
         self.new = new
+        # name |-> expr: x := N 以及 alpha-renaming 产生的 y := z
+        # 改名与替换在同一次遍历中完成
+        self.mapping: dict[str, Expr] = {old.name: new}
+        self._new_free_vars: set[str] = None  # FV(new)，第一次遇到 lambda 时计算
+
+    def _free_vars_of_new(self) -> set[str]:
+        if self._new_free_vars is None:
+            self._new_free_vars = _free_vars(self.new)
+        return self._new_free_vars
 
     def visit_LambdaExpr(self, node: LambdaExpr):
         """
@@ -317,40 +337,45 @@ class _TermSubstitutionVisitor(TransformVisitor):
         (λy. E)[x := N] = λy. E[x := N]  if y ∉ FV(N)
         (λy. E)[x := N] = λz. E[y := z][x := N]
         """
-        if node.param_name == self.old.name:
-            return node
-        elif node.param_name not in _FreeVarVisitor().visit(self.new):
-            return LambdaExpr(node.param_name, None, self.visit(node.body))
-        else:
-            temp_name = _new_temp_name(node.param_name)
-            result_body = _TermSubstitutionVisitor(
-                NamedExpr(node.param_name), NamedExpr(temp_name)
-            ).visit(node.body)
-            result_body = self.visit(result_body)
-            return LambdaExpr(temp_name, None, result_body)
+        outer_mapping = self.mapping
+        mapping = outer_mapping
+        param_name = node.param_name
+        if param_name in mapping:
+            # 被 lambda 重新绑定的名字在 body 中不再替换
+            mapping = {k: v for k, v in mapping.items() if k != param_name}
+            if len(mapping) == 0:
+                return node
+        if self.old.name in mapping and param_name in self._free_vars_of_new():
+            param_name = _new_temp_name(node.param_name)
+            mapping = {**mapping, node.param_name: NamedExpr(param_name)}
+
+        self.mapping = mapping
+        body = self.visit(node.body)
+        self.mapping = outer_mapping
+        return LambdaExpr(param_name, None, body)
 
     def visit_NamedExpr(self, node: NamedExpr):
-        if node.name == self.old.name:
-            return self.new
+        return self.mapping.get(node.name, node)
+
+
+def _free_vars(expr: Expr) -> set[str]:
+    # 显式栈代替递归，栈中每项为 (expr, 此处被 lambda 绑定的名字)
+    free_vars = set()
+    stack = [(expr, frozenset())]
+    while stack:
+        node, bound = stack.pop()
+        if isinstance(node, NamedExpr):
+            if node.name not in bound:
+                free_vars.add(node.name)
+        elif isinstance(node, LambdaExpr):
+            stack.append((node.body, bound | {node.param_name}))
         else:
-            return node
-
-
-class _FreeVarVisitor(NodeVisitor):
-    def __init__(self):
-        super().__init__()
-        self.bound_var_names = []
-        self.free_vars = set()
-
-    def visit(self, node: ASTNode):
-        super().visit(node)
-        return self.free_vars
-
-    def visit_ForAllType(self, node: ForAllType):
-        self.bound_var_names.append(node.param_name)
-        self.visit(node.body)
-        self.bound_var_names.pop()
-
-    def visit_NamedType(self, node: NamedType):
-        if node.name not in self.bound_var_names:
-            self.free_vars.add(node.name)
+            # 只看子表达式，类型标注中的名字不是变量
+            for _, value in iter_fields(node):
+                if isinstance(value, Expr):
+                    stack.append((value, bound))
+                elif isinstance(value, list):  # list elements / trait bounds
+                    stack.extend((item, bound) for item in value if isinstance(item, Expr))
+                elif isinstance(value, tuple):  # record fields
+                    stack.extend((v, bound) for _, v in value)
+    return free_vars
@@ -1,6 +1,8 @@
 from __future__ import annotations
-from dataclasses import dataclass, fields, is_dataclass
+import sys
+from dataclasses import dataclass, field, fields, is_dataclass
 from typing import ClassVar
+from weakref import WeakValueDictionary
 
 from .tokenizer import tokenize, TokenType, TokenStream
 
@@ -119,7 +121,7 @@ def parse(code: str):
     return tree
 
 
-@dataclass(kw_only=True)
+@dataclass(kw_only=True, slots=True)
 class ASTNode:
     lineno: int = None
     checked_type: Type = None
@@ -132,9 +134,11 @@ class ASTNode:
         if not is_dataclass(self):
             return result
 
-        for field in fields(self):
-            value = getattr(self, field.name)
-            result += f"\n{pad}  {field.name}: {self._format_value(value, indent + 2)}"
+        for f in fields(self):
+            if not f.repr:
+                continue
+            value = getattr(self, f.name)
+            result += f"\n{pad}  {f.name}: {self._format_value(value, indent + 2)}"
 
         return result
 
@@ -166,7 +170,7 @@ class ASTNode:
         return "\n".join(pad + line for line in text.splitlines())
 
 
-@dataclass
+@dataclass(slots=True)
 class Program(ASTNode):
     statements: list[Stmt]
 
@@ -181,10 +185,10 @@ class Program(ASTNode):
         return Program(statements, lineno=lineno)
 
     def __str__(self):
-        return "\n".join(str(stmt) for stmt in self.statements)
+        return "\n".join(map(str, self.statements))
 
 
-@dataclass
+@dataclass(slots=True)
 class Stmt(ASTNode):
     @classmethod
     def parse(cls, tokens: TokenStream):
@@ -205,7 +209,7 @@ class Stmt(ASTNode):
             return ExprStmt.parse(tokens)
 
 
-@dataclass
+@dataclass(slots=True)
 class AssignStmt(Stmt):
     name: str
     expr: Expr
@@ -213,17 +217,17 @@ class AssignStmt(Stmt):
     @classmethod
     def parse(cls, tokens: TokenStream):
         lineno = tokens.cur_line()
-        name = tokens.expect(TokenType.IDENT).value
-        tokens.expect(TokenType.ASSIGN)
+        name = tokens.expect_one(TokenType.IDENT).value
+        tokens.expect_one(TokenType.ASSIGN)
         value = Expr.parse(tokens)
-        tokens.expect(TokenType.SEMICOLON)
+        tokens.expect_one(TokenType.SEMICOLON)
         return AssignStmt(name, value, lineno=lineno)
 
     def __str__(self):
         return f"{self.name} = {self.expr};"
 
 
-@dataclass
+@dataclass(slots=True)
 class TypeAssignStmt(ASTNode):
     name: str
     type: Type
@@ -231,18 +235,18 @@ class TypeAssignStmt(ASTNode):
     @classmethod
     def parse(cls, tokens: TokenStream):
         lineno = tokens.cur_line()
-        tokens.expect(TokenType.TYPE)
-        name = tokens.expect(TokenType.IDENT).value
-        tokens.expect(TokenType.ASSIGN)
+        tokens.expect_one(TokenType.TYPE)
+        name = tokens.expect_one(TokenType.IDENT).value
+        tokens.expect_one(TokenType.ASSIGN)
         type = Type.parse(tokens)
-        tokens.expect(TokenType.SEMICOLON)
+        tokens.expect_one(TokenType.SEMICOLON)
         return TypeAssignStmt(name, type, lineno=lineno)
 
     def __str__(self):
         return f"type {self.name} = {self.type};"
 
 
-@dataclass
+@dataclass(slots=True)
 class ExprStmt(Stmt):
     expr: Expr
 
@@ -250,14 +254,14 @@ class ExprStmt(Stmt):
     def parse(cls, tokens: TokenStream):
         lineno = tokens.cur_line()
         expr = Expr.parse(tokens)
-        tokens.expect(TokenType.SEMICOLON)
+        tokens.expect_one(TokenType.SEMICOLON)
         return ExprStmt(expr, lineno=lineno)
 
     def __str__(self):
         return f"{self.expr};"
 
 
-@dataclass
+@dataclass(slots=True)
 class InstanceEnvStmt(Stmt):
     name: str
     type_param: Type
@@ -267,7 +271,7 @@ class InstanceEnvStmt(Stmt):
         return f"// (Env) trait-instance {self.name} ({self.type_param}) = {self.inst_expr};"
 
 
-@dataclass
+@dataclass(slots=True)
 class TraitFieldEnvStmt(Stmt):
     field_name: str
     trait_name: str
@@ -277,7 +281,7 @@ class TraitFieldEnvStmt(Stmt):
         return f"// (Env) trait-field {self.trait_name}.{self.field_name}: {self.type};"
 
 
-@dataclass
+@dataclass(slots=True)
 class TraitStmt(Stmt):
     name: str
     type_params: list[str]
@@ -286,20 +290,20 @@ class TraitStmt(Stmt):
     @classmethod
     def parse(cls, tokens: TokenStream):
         lineno = tokens.cur_line()
-        tokens.expect(TokenType.TRAIT)
-        name = tokens.expect(TokenType.IDENT).value
+        tokens.expect_one(TokenType.TRAIT)
+        name = tokens.expect_one(TokenType.IDENT).value
         type_params = []
         while tokens.peek().type == TokenType.IDENT:
-            type_params.append(tokens.expect(TokenType.IDENT).value)
-        tokens.expect(TokenType.LBRACE)
+            type_params.append(tokens.expect_one(TokenType.IDENT).value)
+        tokens.expect_one(TokenType.LBRACE)
         items = []
         while tokens.peek().type != TokenType.RBRACE:
             items.append(TypeBindItem.parse(tokens))
-        tokens.expect(TokenType.RBRACE)
+        tokens.expect_one(TokenType.RBRACE)
         return TraitStmt(name, type_params, items, lineno=lineno)
 
 
-@dataclass
+@dataclass(slots=True)
 class StructStmt(Stmt):
     name: str
     items: list[TypeBindItem]
@@ -307,17 +311,17 @@ class StructStmt(Stmt):
     @classmethod
     def parse(cls, tokens: TokenStream):
         lineno = tokens.cur_line()
-        tokens.expect(TokenType.STRUCT)
-        name = tokens.expect(TokenType.IDENT).value
-        tokens.expect(TokenType.LBRACE)
+        tokens.expect_one(TokenType.STRUCT)
+        name = tokens.expect_one(TokenType.IDENT).value
+        tokens.expect_one(TokenType.LBRACE)
         items = []
         while tokens.peek().type != TokenType.RBRACE:
             items.append(TypeBindItem.parse(tokens))
-        tokens.expect(TokenType.RBRACE)
+        tokens.expect_one(TokenType.RBRACE)
         return StructStmt(name, items, lineno=lineno)
 
 
-@dataclass
+@dataclass(slots=True)
 class ImplStmt(Stmt):
     name: str
     type_param: Type
@@ -326,19 +330,19 @@ class ImplStmt(Stmt):
     @classmethod
     def parse(cls, tokens: TokenStream):
         lineno = tokens.cur_line()
-        tokens.expect(TokenType.IMPL)
-        name = tokens.expect(TokenType.IDENT).value
-        tokens.expect(TokenType.FOR)
+        tokens.expect_one(TokenType.IMPL)
+        name = tokens.expect_one(TokenType.IDENT).value
+        tokens.expect_one(TokenType.FOR)
         type_param = NamedType.parse(tokens)
-        tokens.expect(TokenType.LBRACE)
+        tokens.expect_one(TokenType.LBRACE)
         items = []
         while tokens.peek().type != TokenType.RBRACE:
             items.append(AssignItem.parse(tokens))
-        tokens.expect(TokenType.RBRACE)
+        tokens.expect_one(TokenType.RBRACE)
         return ImplStmt(name, type_param, items, lineno=lineno)
 
 
-@dataclass
+@dataclass(slots=True)
 class TypeBindItem(ASTNode):
     name: str
     type: Type
@@ -346,14 +350,14 @@ class TypeBindItem(ASTNode):
     @classmethod
     def parse(cls, tokens: TokenStream):
         lineno = tokens.cur_line()
-        name = tokens.expect(TokenType.IDENT).value
-        tokens.expect(TokenType.COLON)
+        name = tokens.expect_one(TokenType.IDENT).value
+        tokens.expect_one(TokenType.COLON)
         type = Type.parse(tokens)
-        tokens.expect(TokenType.SEMICOLON)
+        tokens.expect_one(TokenType.SEMICOLON)
         return TypeBindItem(name, type, lineno=lineno)
 
 
-@dataclass
+@dataclass(slots=True)
 class AssignItem(ASTNode):
     name: str
     value: Expr
@@ -361,31 +365,37 @@ class AssignItem(ASTNode):
     @classmethod
     def parse(cls, tokens: TokenStream):
         lineno = tokens.cur_line()
-        name = tokens.expect(TokenType.IDENT).value
-        tokens.expect(TokenType.ASSIGN)
+        name = tokens.expect_one(TokenType.IDENT).value
+        tokens.expect_one(TokenType.ASSIGN)
         value = Expr.parse(tokens)
-        tokens.expect(TokenType.SEMICOLON)
+        tokens.expect_one(TokenType.SEMICOLON)
         return AssignItem(name, value, lineno=lineno)
 
 
-@dataclass
+@dataclass(slots=True)
 class Expr(ASTNode):
     @classmethod
     def parse(cls, tokens: TokenStream):
-        return LambdaExpr.parse(tokens)
+        # \x: T. E  or  \X. E  or  \X impl B. E
+        if tokens.peek().type == TokenType.BACKSLASH:
+            lookahead = tokens.peek_forward(2).type
+            if lookahead == TokenType.COLON:
+                return LambdaExpr.parse(tokens)
+            elif lookahead in (TokenType.DOT, TokenType.IMPL):
+                return TypeLambdaExpr.parse(tokens)
+        return IfExpr.parse(tokens)
 
     def wrap(self, arg: Expr) -> str:
         assert isinstance(arg, Expr), f"Expected Expr, got {type(arg)}"
         arg_prec = type(arg).precedence
         self_prec = type(self).precedence
-        s = str(arg)
         if arg_prec < self_prec:
-            return f"({s})"
+            return f"({arg})"
         else:
-            return str(s)
+            return str(arg)
 
 
-@dataclass
+@dataclass(slots=True)
 class LambdaExpr(Expr):
     param_name: str
     param_type: Type
@@ -395,19 +405,13 @@ class LambdaExpr(Expr):
     @classmethod
     def parse(cls, tokens: TokenStream):
         lineno = tokens.cur_line()
-        if (
-            tokens.peek().type == TokenType.BACKSLASH
-            and tokens.peek_forward(2).type == TokenType.COLON
-        ):
-            tokens.expect(TokenType.BACKSLASH)
-            param_name = tokens.expect(TokenType.IDENT).value
-            tokens.expect(TokenType.COLON)
-            param_type = Type.parse(tokens)
-            tokens.expect(TokenType.DOT)
-            body = Expr.parse(tokens)
-            return LambdaExpr(param_name, param_type, body, lineno=lineno)
-        else:
-            return TypeLambdaExpr.parse(tokens)
+        tokens.expect_one(TokenType.BACKSLASH)
+        param_name = tokens.expect_one(TokenType.IDENT).value
+        tokens.expect_one(TokenType.COLON)
+        param_type = Type.parse(tokens)
+        tokens.expect_one(TokenType.DOT)
+        body = Expr.parse(tokens)
+        return LambdaExpr(param_name, param_type, body, lineno=lineno)
 
     def __str__(self):
         if self.param_type is None:  # Erased type
@@ -416,7 +420,17 @@ class LambdaExpr(Expr):
             return f"\\{self.param_name}: {self.param_type}. {self.body}"
 
 
-@dataclass
+# TypeBound ::= IDENT ("+" IDENT)*, shared by TypeLambdaExpr and ForAllType
+def _parse_trait_bound_list(tokens: TokenStream) -> list[str]:
+    bounds = []
+    while tokens.peek().type != TokenType.DOT:
+        bounds.append(tokens.expect_one(TokenType.IDENT).value)
+        if tokens.peek().type == TokenType.ADD:
+            tokens.expect_one(TokenType.ADD)
+    return bounds
+
+
+@dataclass(slots=True)
 class TypeLambdaExpr(Expr):
     param_name: str
     body: Expr
@@ -426,35 +440,25 @@ class TypeLambdaExpr(Expr):
     @classmethod
     def parse(cls, tokens: TokenStream):
         lineno = tokens.cur_line()
-        if tokens.peek().type == TokenType.BACKSLASH and tokens.peek_forward(2).type in (
-            TokenType.DOT,
-            TokenType.IMPL,
-        ):
-            tokens.expect(TokenType.BACKSLASH)
-            param_name = tokens.expect(TokenType.IDENT).value
-            trait_bounds = []
-            # has bounds?
-            if tokens.peek().type == TokenType.IMPL:
-                tokens.expect(TokenType.IMPL)
-                while tokens.peek().type != TokenType.DOT:
-                    trait_bounds.append(tokens.expect(TokenType.IDENT).value)
-                    if tokens.peek().type == TokenType.ADD:
-                        tokens.expect(TokenType.ADD)
-            tokens.expect(TokenType.DOT)
-            body = Expr.parse(tokens)
-            return TypeLambdaExpr(param_name, body, trait_bounds, lineno=lineno)
-        else:
-            return IfExpr.parse(tokens)
+        tokens.expect_one(TokenType.BACKSLASH)
+        param_name = tokens.expect_one(TokenType.IDENT).value
+        trait_bounds = []
+        # has bounds?
+        if tokens.peek().type == TokenType.IMPL:
+            tokens.expect_one(TokenType.IMPL)
+            trait_bounds = _parse_trait_bound_list(tokens)
+        tokens.expect_one(TokenType.DOT)
+        body = Expr.parse(tokens)
+        return TypeLambdaExpr(param_name, body, trait_bounds, lineno=lineno)
 
     def __str__(self):
         if len(self.trait_bounds) == 0:
             return f"\\{self.param_name}. {self.body}"
         else:
-            trait_bounds_str = " + ".join(self.trait_bounds)
-            return f"\\{self.param_name} impl {trait_bounds_str}. {self.body}"
+            return f"\\{self.param_name} impl {' + '.join(self.trait_bounds)}. {self.body}"
 
 
-@dataclass
+@dataclass(slots=True)
 class IfExpr(Expr):
     condition: Expr
     then_expr: Expr
@@ -465,11 +469,11 @@ class IfExpr(Expr):
     def parse(cls, tokens: TokenStream):
         lineno = tokens.cur_line()
         if tokens.peek().type == TokenType.IF:
-            tokens.expect(TokenType.IF)
+            tokens.expect_one(TokenType.IF)
             condition = Expr.parse(tokens)
-            tokens.expect(TokenType.THEN)
+            tokens.expect_one(TokenType.THEN)
             then_expr = Expr.parse(tokens)
-            tokens.expect(TokenType.ELSE)
+            tokens.expect_one(TokenType.ELSE)
             else_expr = Expr.parse(tokens)
             return IfExpr(condition, then_expr, else_expr, lineno=lineno)
         else:
@@ -479,7 +483,7 @@ class IfExpr(Expr):
         return f"if {self.wrap(self.condition)} then {self.wrap(self.then_expr)} else {self.wrap(self.else_expr)}"
 
 
-@dataclass
+@dataclass(slots=True)
 class LogicOrExpr(Expr):
     left: Expr
     right: Expr
@@ -490,7 +494,7 @@ class LogicOrExpr(Expr):
         lineno = tokens.cur_line()
         left = LogicAndExpr.parse(tokens)
         while tokens.peek().type == TokenType.OR:
-            tokens.expect(TokenType.OR)
+            tokens.next()
             right = LogicAndExpr.parse(tokens)
             left = LogicOrExpr(left, right, lineno=lineno)
         return left
@@ -499,7 +503,7 @@ class LogicOrExpr(Expr):
         return f"{self.wrap(self.left)} || {self.wrap(self.right)}"
 
 
-@dataclass
+@dataclass(slots=True)
 class LogicAndExpr(Expr):
     left: Expr
     right: Expr
@@ -510,7 +514,7 @@ class LogicAndExpr(Expr):
         lineno = tokens.cur_line()
         left = LogicNotExpr.parse(tokens)
         while tokens.peek().type == TokenType.AND:
-            tokens.expect(TokenType.AND)
+            tokens.next()
             right = LogicNotExpr.parse(tokens)
             left = LogicAndExpr(left, right, lineno=lineno)
         return left
@@ -519,7 +523,7 @@ class LogicAndExpr(Expr):
         return f"{self.wrap(self.left)} && {self.wrap(self.right)}"
 
 
-@dataclass
+@dataclass(slots=True)
 class LogicNotExpr(Expr):
     expr: Expr
     precedence: ClassVar[int] = 4
@@ -527,18 +531,32 @@ class LogicNotExpr(Expr):
     @classmethod
     def parse(cls, tokens: TokenStream):
         lineno = tokens.cur_line()
-        if tokens.peek().type == TokenType.NOT:
-            tokens.expect(TokenType.NOT)
-            term = LogicNotExpr.parse(tokens)
-            return LogicNotExpr(term, lineno=lineno)
-        else:
-            return RelExpr.parse(tokens)
+        n = 0
+        while tokens.peek().type == TokenType.NOT:
+            tokens.expect_one(TokenType.NOT)
+            n += 1
+        term = RelExpr.parse(tokens)
+        for _ in range(n):
+            term = LogicNotExpr(term, lineno=lineno)
+        return term
 
     def __str__(self):
         return f"!{self.wrap(self.expr)}"
 
 
-@dataclass
+_REL_OPS = (
+    TokenType.GT,
+    TokenType.LT,
+    TokenType.GEQ,
+    TokenType.LEQ,
+    TokenType.EQ,
+    TokenType.NEQ,
+)
+_ADD_OPS = (TokenType.ADD, TokenType.SUB)
+_MUL_OPS = (TokenType.MULT, TokenType.DIV, TokenType.MOD)
+
+
+@dataclass(slots=True)
 class RelExpr(Expr):
     left: Expr
     op: str
@@ -548,17 +566,9 @@ class RelExpr(Expr):
     @classmethod
     def parse(cls, tokens: TokenStream):
         lineno = tokens.cur_line()
-        ops = (
-            TokenType.GT,
-            TokenType.LT,
-            TokenType.GEQ,
-            TokenType.LEQ,
-            TokenType.EQ,
-            TokenType.NEQ,
-        )
         left = AddExpr.parse(tokens)
-        while tokens.peek().type in ops:
-            op = tokens.expect(*ops).value
+        while tokens.peek().type in _REL_OPS:
+            op = tokens.next().value
             right = AddExpr.parse(tokens)
             left = RelExpr(left, op, right, lineno=lineno)
         return left
@@ -567,7 +577,7 @@ class RelExpr(Expr):
         return f"{self.wrap(self.left)} {self.op} {self.wrap(self.right)}"
 
 
-@dataclass
+@dataclass(slots=True)
 class AddExpr(Expr):
     left: Expr
     op: str
@@ -577,10 +587,9 @@ class AddExpr(Expr):
     @classmethod
     def parse(cls, tokens: TokenStream):
         lineno = tokens.cur_line()
-        ops = (TokenType.ADD, TokenType.SUB)
         left = MulExpr.parse(tokens)
-        while tokens.peek().type in ops:
-            op = tokens.expect(*ops).value
+        while tokens.peek().type in _ADD_OPS:
+            op = tokens.next().value
             right = MulExpr.parse(tokens)
             left = AddExpr(left, op, right, lineno=lineno)
         return left
@@ -589,7 +598,7 @@ class AddExpr(Expr):
         return f"{self.wrap(self.left)} {self.op} {self.wrap(self.right)}"
 
 
-@dataclass
+@dataclass(slots=True)
 class MulExpr(Expr):
     left: Expr
     op: str
@@ -599,10 +608,9 @@ class MulExpr(Expr):
     @classmethod
     def parse(cls, tokens: TokenStream):
         lineno = tokens.cur_line()
-        ops = (TokenType.MULT, TokenType.DIV, TokenType.MOD)
         left = NegExpr.parse(tokens)
-        while tokens.peek().type in ops:
-            op = tokens.expect(*ops).value
+        while tokens.peek().type in _MUL_OPS:
+            op = tokens.next().value
             right = NegExpr.parse(tokens)
             left = MulExpr(left, op, right, lineno=lineno)
         return left
@@ -611,7 +619,7 @@ class MulExpr(Expr):
         return f"{self.wrap(self.left)} {self.op} {self.wrap(self.right)}"
 
 
-@dataclass
+@dataclass(slots=True)
 class NegExpr(Expr):
     expr: Expr
     precedence: ClassVar[int] = 8
@@ -619,30 +627,34 @@ class NegExpr(Expr):
     @classmethod
     def parse(cls, tokens: TokenStream):
         lineno = tokens.cur_line()
-        if tokens.peek().type == TokenType.SUB:
-            tokens.expect(TokenType.SUB)
-            expr = NegExpr.parse(tokens)
-            return NegExpr(expr, lineno=lineno)
-        else:
-            return AppExpr.parse(tokens)
+        n = 0
+        while tokens.peek().type == TokenType.SUB:
+            tokens.expect_one(TokenType.SUB)
+            n += 1
+        expr = AppExpr.parse(tokens)
+        for _ in range(n):
+            expr = NegExpr(expr, lineno=lineno)
+        return expr
 
     def __str__(self):
         return f"-{self.wrap(self.expr)}"
 
 
-_named_expr_start = {
-    TokenType.IDENT,
-    TokenType.NUMBER,
-    TokenType.STRING,
-    TokenType.TRUE,
-    TokenType.FALSE,
-    TokenType.LPAREN,
-    TokenType.LBRACKET,
-    TokenType.LBRACE,
-}
+_named_expr_start = frozenset(
+    {
+        TokenType.IDENT,
+        TokenType.NUMBER,
+        TokenType.STRING,
+        TokenType.TRUE,
+        TokenType.FALSE,
+        TokenType.LPAREN,
+        TokenType.LBRACKET,
+        TokenType.LBRACE,
+    }
+)
 
 
-@dataclass
+@dataclass(slots=True)
 class AppExpr(Expr):
     func: Expr
     arg: Expr
@@ -657,7 +669,7 @@ class AppExpr(Expr):
                 arg = TypeAnnotatedExpr.parse(tokens)
                 func = AppExpr(func, arg, lineno=lineno)
             elif tokens.peek().type == TokenType.AT:
-                tokens.expect(TokenType.AT)
+                tokens.expect_one(TokenType.AT)
                 type_arg = NamedType.parse(tokens)
                 func = TypeAppExpr(func, type_arg, lineno=lineno)
             else:
@@ -671,7 +683,7 @@ class AppExpr(Expr):
             return f"{self.wrap(self.func)} {self.wrap(self.arg)}"
 
 
-@dataclass
+@dataclass(slots=True)
 class TypeAppExpr(Expr):
     func: Expr
     type_arg: Type
@@ -681,7 +693,7 @@ class TypeAppExpr(Expr):
         return f"{self.wrap(self.func)} @{self.type_arg}"
 
 
-@dataclass
+@dataclass(slots=True)
 class TypeAnnotatedExpr(Expr):
     expr: Expr
     type: Type
@@ -692,7 +704,7 @@ class TypeAnnotatedExpr(Expr):
         lineno = tokens.cur_line()
         expr = FieldAccessExpr.parse(tokens)
         if tokens.peek().type == TokenType.COLON:
-            tokens.expect(TokenType.COLON)
+            tokens.expect_one(TokenType.COLON)
             type = Type.parse(tokens)
             return TypeAnnotatedExpr(expr, type, lineno=lineno)
         else:
@@ -702,7 +714,7 @@ class TypeAnnotatedExpr(Expr):
         return f"{self.wrap(self.expr)}: {self.type}"
 
 
-@dataclass
+@dataclass(slots=True)
 class FieldAccessExpr(Expr):
     record: Expr
     field_name: str
@@ -713,8 +725,8 @@ class FieldAccessExpr(Expr):
         lineno = tokens.cur_line()
         record = NamedExpr.parse(tokens)
         while tokens.peek().type == TokenType.DOT:
-            tokens.expect(TokenType.DOT)
-            field_name = tokens.expect(TokenType.IDENT).value
+            tokens.expect_one(TokenType.DOT)
+            field_name = tokens.expect_one(TokenType.IDENT).value
             record = FieldAccessExpr(record, field_name, lineno=lineno)
         return record
 
@@ -722,7 +734,7 @@ class FieldAccessExpr(Expr):
         return f"{self.wrap(self.record)}.{self.field_name}"
 
 
-@dataclass
+@dataclass(slots=True)
 class NamedExpr(Expr):
     name: str
     is_builtin: bool = False
@@ -731,43 +743,64 @@ class NamedExpr(Expr):
     @classmethod
     def parse(cls, tokens: TokenStream):
         lineno = tokens.cur_line()
-        if tokens.peek().type == TokenType.IDENT:
-            name = tokens.expect(TokenType.IDENT).value
-            from .builtin import built_in_funcs
-
-            is_builtin = name in built_in_funcs
-            return NamedExpr(name, lineno=lineno, is_builtin=is_builtin)
-
-        elif tokens.peek().type == TokenType.NUMBER:
-            value = int(tokens.expect(TokenType.NUMBER).value)
-            return ValueExpr(value, lineno=lineno)
-        elif tokens.peek().type == TokenType.STRING:
-            value = tokens.expect(TokenType.STRING).value
-            return ValueExpr(value, lineno=lineno)
-        elif tokens.peek().type == TokenType.TRUE:
-            tokens.expect(TokenType.TRUE)
-            return ValueExpr(True, lineno=lineno)
-        elif tokens.peek().type == TokenType.FALSE:
-            tokens.expect(TokenType.FALSE)
-            return ValueExpr(False, lineno=lineno)
-
-        elif tokens.peek().type == TokenType.LPAREN:
-            tokens.expect(TokenType.LPAREN)
-            expr = Expr.parse(tokens)
-            tokens.expect(TokenType.RPAREN)
-            return expr
-        elif tokens.peek().type == TokenType.LBRACKET:
-            return ListExpr.parse(tokens)
-        elif tokens.peek().type == TokenType.LBRACE:
-            return RecordExpr.parse(tokens)
-        else:
-            tokens.expect(*_named_expr_start)
+        handler = _NAMED_EXPR_HANDLERS.get(tokens.peek().type)
+        if handler is None:
+            tokens.expect_set(_named_expr_start)
+        return handler(tokens, lineno)
 
     def __str__(self):
         return self.name
 
 
-@dataclass
+def _parse_ident(tokens: TokenStream, lineno: int):
+    name = tokens.expect_one(TokenType.IDENT).value
+    from .builtin import built_in_funcs
+
+    is_builtin = name in built_in_funcs
+    return NamedExpr(name, lineno=lineno, is_builtin=is_builtin)
+
+
+def _parse_number(tokens: TokenStream, lineno: int):
+    value = int(tokens.expect_one(TokenType.NUMBER).value)
+    return ValueExpr(value, lineno=lineno)
+
+
+def _parse_string(tokens: TokenStream, lineno: int):
+    value = tokens.expect_one(TokenType.STRING).value
+    return ValueExpr(value, lineno=lineno)
+
+
+def _parse_true(tokens: TokenStream, lineno: int):
+    tokens.expect_one(TokenType.TRUE)
+    return ValueExpr(True, lineno=lineno)
+
+
+def _parse_false(tokens: TokenStream, lineno: int):
+    tokens.expect_one(TokenType.FALSE)
+    return ValueExpr(False, lineno=lineno)
+
+
+def _parse_paren_expr(tokens: TokenStream, lineno: int):
+    tokens.expect_one(TokenType.LPAREN)
+    expr = Expr.parse(tokens)
+    tokens.expect_one(TokenType.RPAREN)
+    return expr
+
+
+# first token type |-> parser of NamedExpr
+_NAMED_EXPR_HANDLERS = {
+    TokenType.IDENT: _parse_ident,
+    TokenType.NUMBER: _parse_number,
+    TokenType.STRING: _parse_string,
+    TokenType.TRUE: _parse_true,
+    TokenType.FALSE: _parse_false,
+    TokenType.LPAREN: _parse_paren_expr,
+    TokenType.LBRACKET: lambda tokens, lineno: ListExpr.parse(tokens),
+    TokenType.LBRACE: lambda tokens, lineno: RecordExpr.parse(tokens),
+}
+
+
+@dataclass(slots=True)
 class ValueExpr(Expr):
     value: str | int | bool
     precedence: ClassVar[int] = 11
@@ -783,7 +816,7 @@ class ValueExpr(Expr):
             return str(self.value)
 
 
-@dataclass
+@dataclass(slots=True)
 class ListExpr(Expr):
     elements: list[Expr]
     precedence: ClassVar[int] = 11
@@ -791,46 +824,57 @@ class ListExpr(Expr):
     @classmethod
     def parse(cls, tokens: TokenStream):
         lineno = tokens.cur_line()
-        tokens.expect(TokenType.LBRACKET)
+        tokens.expect_one(TokenType.LBRACKET)
         elements = []
         while tokens.peek().type != TokenType.RBRACKET:
             elements.append(Expr.parse(tokens))
             if tokens.peek().type == TokenType.COMMA:
-                tokens.expect(TokenType.COMMA)
-        tokens.expect(TokenType.RBRACKET)
+                tokens.expect_one(TokenType.COMMA)
+        tokens.expect_one(TokenType.RBRACKET)
         return ListExpr(elements, lineno=lineno)
 
     def __str__(self):
         return f"[{', '.join(map(str, self.elements))}]"
 
 
-@dataclass
+@dataclass(slots=True)
 class RecordExpr(Expr):
-    fields: dict[str, Expr]
+    fields: tuple[tuple[str, Expr], ...]  # in source order
+    # field name |-> value, built on the first get_field call
+    _field_index: dict[str, Expr] = field(default=None, init=False, repr=False, compare=False)
     precedence: ClassVar[int] = 11
 
     @classmethod
     def parse(cls, tokens: TokenStream):
         lineno = tokens.cur_line()
-        tokens.expect(TokenType.LBRACE)
-        fields = {}
+        tokens.expect_one(TokenType.LBRACE)
+        pending = []
+        seen = set()
         while tokens.peek().type != TokenType.RBRACE:
-            field_name = tokens.expect(TokenType.IDENT).value
-            if field_name in fields:
+            field_name = tokens.expect_one(TokenType.IDENT).value
+            if field_name in seen:
                 tokens.error(tokens.peek_forward(-1), f"Duplicate field name: {field_name}")
-            tokens.expect(TokenType.ASSIGN)
+            seen.add(field_name)
+            tokens.expect_one(TokenType.ASSIGN)
             field_value = Expr.parse(tokens)
-            fields[field_name] = field_value
+            pending.append((field_name, field_value))
             if tokens.peek().type == TokenType.COMMA:
-                tokens.expect(TokenType.COMMA)
-        tokens.expect(TokenType.RBRACE)
-        return RecordExpr(fields, lineno=lineno)
+                tokens.expect_one(TokenType.COMMA)
+        tokens.expect_one(TokenType.RBRACE)
+        return RecordExpr(tuple(pending), lineno=lineno)
+
+    def get_field(self, name: str) -> Expr | None:
+        index = self._field_index
+        if index is None:
+            # reversed: the first field wins if a name occurs twice
+            index = self._field_index = dict(reversed(self.fields))
+        return index.get(name)
 
     def __str__(self):
-        return f"{{{', '.join(f'{name} = {value}' for name, value in self.fields.items())}}}"
+        return f"{{{', '.join(f'{name} = {value}' for name, value in self.fields)}}}"
 
 
-@dataclass
+@dataclass(slots=True, weakref_slot=True)
 class Type(ASTNode):
     @classmethod
     def parse(cls, tokens: TokenStream):
@@ -840,14 +884,13 @@ class Type(ASTNode):
         assert isinstance(arg, Type), f"Expected Type, got {type(arg)}"
         arg_prec = type(arg).precedence
         self_prec = type(self).precedence
-        s = str(arg)
         if arg_prec < self_prec:
-            return f"({s})"
+            return f"({arg})"
         else:
-            return str(s)
+            return str(arg)
 
 
-@dataclass
+@dataclass(slots=True)
 class ForAllType(Type):
     param_name: str
     body: Type
@@ -858,32 +901,27 @@ class ForAllType(Type):
     def parse(cls, tokens: TokenStream):
         lineno = tokens.cur_line()
         if tokens.peek().type == TokenType.FORALL:
-            tokens.expect(TokenType.FORALL)
-            param_name = tokens.expect(TokenType.IDENT).value
+            tokens.expect_one(TokenType.FORALL)
+            param_name = tokens.expect_one(TokenType.IDENT).value
             trait_bounds = []
             # has bounds?
             if tokens.peek().type == TokenType.IMPL:
-                tokens.expect(TokenType.IMPL)
-                while tokens.peek().type != TokenType.DOT:
-                    trait_bounds.append(tokens.expect(TokenType.IDENT).value)
-                    if tokens.peek().type == TokenType.ADD:
-                        tokens.expect(TokenType.ADD)
-            tokens.expect(TokenType.DOT)
+                tokens.expect_one(TokenType.IMPL)
+                trait_bounds = _parse_trait_bound_list(tokens)
+            tokens.expect_one(TokenType.DOT)
             body = Type.parse(tokens)
             return ForAllType(param_name, body, trait_bounds, lineno=lineno)
         else:
             return ArrowType.parse(tokens)
 
     def __str__(self):
-        param_name = self.param_name
-        body = str(self.body)
         if len(self.trait_bounds) == 0:
-            return f"forall {param_name}. {body}"
+            return f"forall {self.param_name}. {self.body}"
         else:
-            return f"forall {param_name} impl {' + '.join(self.trait_bounds)}. {body}"
+            return f"forall {self.param_name} impl {' + '.join(self.trait_bounds)}. {self.body}"
 
     def __eq__(self, other):
-        return (
+        return self is other or (
             isinstance(other, ForAllType)
             and self.param_name == other.param_name
             and self.body == other.body
@@ -893,7 +931,7 @@ class ForAllType(Type):
         return hash((self.param_name, self.body))
 
 
-@dataclass
+@dataclass(slots=True)
 class ArrowType(Type):
     left: Type
     right: Type
@@ -904,7 +942,7 @@ class ArrowType(Type):
         lineno = tokens.cur_line()
         left = AppType.parse(tokens)
         if tokens.peek().type == TokenType.ARROW:
-            tokens.expect(TokenType.ARROW)
+            tokens.expect_one(TokenType.ARROW)
             right = ArrowType.parse(tokens)
             return ArrowType(left, right, lineno=lineno)
         else:
@@ -917,7 +955,7 @@ class ArrowType(Type):
             return f"{self.wrap(self.left)} -> {self.wrap(self.right)}"
 
     def __eq__(self, other):
-        return (
+        return self is other or (
             isinstance(other, ArrowType) and self.left == other.left and self.right == other.right
         )
 
@@ -925,15 +963,17 @@ class ArrowType(Type):
         return hash((self.left, self.right))
 
 
-_named_type_start = {
-    TokenType.IDENT,
-    TokenType.LPAREN,
-    TokenType.LBRACKET,
-    TokenType.LBRACE,
-}
+_named_type_start = frozenset(
+    {
+        TokenType.IDENT,
+        TokenType.LPAREN,
+        TokenType.LBRACKET,
+        TokenType.LBRACE,
+    }
+)
 
 
-@dataclass
+@dataclass(slots=True)
 class AppType(Type):
     func: Type
     arg: Type
@@ -952,13 +992,21 @@ class AppType(Type):
         return f"{self.wrap(self.func)} {self.wrap(self.arg)}"
 
     def __eq__(self, other):
-        return isinstance(other, AppType) and self.func == other.func and self.arg == other.arg
+        return self is other or (
+            isinstance(other, AppType) and self.func == other.func and self.arg == other.arg
+        )
 
     def __hash__(self):
         return hash((self.func, self.arg))
 
 
-@dataclass
+# name |-> NamedType, the shared instances used by solved and built-in types.
+# The parser still allocates one NamedType per mention, so each keeps its own lineno;
+# the type solver maps them onto these instances.
+_NT_CACHE: WeakValueDictionary[str, NamedType] = WeakValueDictionary()
+
+
+@dataclass(slots=True)
 class NamedType(Type):
     name: str
     precedence: ClassVar[int] = 3
@@ -966,32 +1014,52 @@ class NamedType(Type):
     @classmethod
     def parse(cls, tokens: TokenStream):
         lineno = tokens.cur_line()
-        if tokens.peek().type == TokenType.IDENT:
-            name = tokens.expect(TokenType.IDENT).value
-            return NamedType(name, lineno=lineno)
-        elif tokens.peek().type == TokenType.LPAREN:
-            tokens.expect(TokenType.LPAREN)
-            type = Type.parse(tokens)
-            tokens.expect(TokenType.RPAREN)
-            return type
-        elif tokens.peek().type == TokenType.LBRACKET:
-            return ListType.parse(tokens)
-        elif tokens.peek().type == TokenType.LBRACE:
-            return RecordType.parse(tokens)
-        else:
-            tokens.expect(TokenType.IDENT, TokenType.LPAREN, TokenType.LBRACKET, TokenType.LBRACE)
+        handler = _NAMED_TYPE_HANDLERS.get(tokens.peek().type)
+        if handler is None:
+            tokens.expect_set(_named_type_start)
+        return handler(tokens, lineno)
 
     def __str__(self):
         return self.name
 
     def __eq__(self, other):
-        return isinstance(other, NamedType) and self.name == other.name
+        return self is other or (isinstance(other, NamedType) and self.name == other.name)
 
     def __hash__(self):
         return hash(self.name)
 
 
-@dataclass
+def intern_named_type(name: str, lineno: int = None) -> NamedType:
+    nt = _NT_CACHE.get(name)
+    if nt is None:
+        # Identifiers are already interned by the tokenizer;
+        # this also covers generated names like a$1
+        nt = NamedType(sys.intern(name), lineno=lineno)
+        _NT_CACHE[nt.name] = nt
+    return nt
+
+
+def _parse_type_ident(tokens: TokenStream, lineno: int):
+    return NamedType(tokens.expect_one(TokenType.IDENT).value, lineno=lineno)
+
+
+def _parse_paren_type(tokens: TokenStream, lineno: int):
+    tokens.expect_one(TokenType.LPAREN)
+    type = Type.parse(tokens)
+    tokens.expect_one(TokenType.RPAREN)
+    return type
+
+
+# first token type |-> parser of NamedType
+_NAMED_TYPE_HANDLERS = {
+    TokenType.IDENT: _parse_type_ident,
+    TokenType.LPAREN: _parse_paren_type,
+    TokenType.LBRACKET: lambda tokens, lineno: ListType.parse(tokens),
+    TokenType.LBRACE: lambda tokens, lineno: RecordType.parse(tokens),
+}
+
+
+@dataclass(slots=True)
 class ListType(Type):
     elem_type: Type
     precedence: ClassVar[int] = 3
@@ -999,52 +1067,104 @@ class ListType(Type):
     @classmethod
     def parse(cls, tokens: TokenStream):
         lineno = tokens.cur_line()
-        tokens.expect(TokenType.LBRACKET)
+        tokens.expect_one(TokenType.LBRACKET)
         elem_type = Type.parse(tokens)
-        tokens.expect(TokenType.RBRACKET)
+        tokens.expect_one(TokenType.RBRACKET)
         return ListType(elem_type, lineno=lineno)
 
     def __str__(self):
         return f"[{self.elem_type}]"
 
     def __eq__(self, other):
-        return isinstance(other, ListType) and self.elem_type == other.elem_type
+        return self is other or (isinstance(other, ListType) and self.elem_type == other.elem_type)
 
     def __hash__(self):
         return hash(self.elem_type)
 
 
-@dataclass
+@dataclass(slots=True)
 class RecordType(Type):
-    fields: dict[str, Type]
+    fields: tuple[tuple[str, Type], ...]  # sorted by field name
+    # Field names in source order, used only for display; None means the order of fields
+    display_order: list[str] = field(default=None, repr=False, compare=False)
+    # field name |-> type, built on the first get_field call
+    _field_index: dict[str, Type] = field(default=None, init=False, repr=False, compare=False)
     precedence: ClassVar[int] = 3
 
     @classmethod
     def parse(cls, tokens: TokenStream):
         lineno = tokens.cur_line()
-        tokens.expect(TokenType.LBRACE)
+        tokens.expect_one(TokenType.LBRACE)
         fields = {}
         while tokens.peek().type != TokenType.RBRACE:
-            field_name = tokens.expect(TokenType.IDENT).value
+            field_name = tokens.expect_one(TokenType.IDENT).value
             if field_name in fields:
                 tokens.error(tokens.peek_forward(-1), f"Duplicate field name: {field_name}")
-            tokens.expect(TokenType.COLON)
+            tokens.expect_one(TokenType.COLON)
             field_type = Type.parse(tokens)
             fields[field_name] = field_type
             if tokens.peek().type == TokenType.COMMA:
-                tokens.expect(TokenType.COMMA)
-        tokens.expect(TokenType.RBRACE)
-        return RecordType(fields, lineno=lineno)
+                tokens.expect_one(TokenType.COMMA)
+        tokens.expect_one(TokenType.RBRACE)
+        return RecordType.from_items(fields.items(), lineno=lineno)
 
-    @property
-    def sorted_fields(self):
-        return sorted(self.fields.items())
+    @classmethod
+    def from_items(cls, items, lineno=None):
+        # Sorted by field name so that structurally equal record types have equal fields;
+        # the given order is kept in display_order
+        items = list(items)
+        fields = tuple(sorted(items, key=lambda item: item[0]))
+        return cls(fields, [name for name, _ in items], lineno=lineno)
+
+    def get_field(self, name: str) -> Type | None:
+        index = self._field_index
+        if index is None:
+            index = self._field_index = dict(self.fields)
+        return index.get(name)
 
     def __str__(self):
-        return "{" + ", ".join(f"{name}: {type}" for name, type in self.fields.items()) + "}"
+        if self.display_order is None:
+            items = self.fields
+        else:
+            items = ((name, self.get_field(name)) for name in self.display_order)
+        return "{" + ", ".join(f"{name}: {type}" for name, type in items) + "}"
 
     def __eq__(self, other):
-        return isinstance(other, RecordType) and self.sorted_fields == other.sorted_fields
+        return self is other or (isinstance(other, RecordType) and self.fields == other.fields)
 
     def __hash__(self):
-        return hash(tuple(self.sorted_fields))
+        return hash(self.fields)
+
+
+# (cls, *fields) |-> Type, hash-consing of the composite types.
+# Visitors build types bottom-up from interned children, so structurally equal
+# types end up as one instance and __eq__ mostly stops at the identity check.
+# Children are keyed by id: ForAllType.__eq__ ignores trait_bounds, so comparing
+# them structurally could merge types with different bounds. A cached type keeps
+# its children alive, so their ids stay valid while the entry exists.
+# Records also key on display_order, so each keeps the field order it was written in.
+_TYPE_CACHE: WeakValueDictionary[tuple, Type] = WeakValueDictionary()
+
+_INTERN_KEYS = {
+    ForAllType: lambda t: (ForAllType, t.param_name, id(t.body), tuple(t.trait_bounds)),
+    ArrowType: lambda t: (ArrowType, id(t.left), id(t.right)),
+    AppType: lambda t: (AppType, id(t.func), id(t.arg)),
+    ListType: lambda t: (ListType, id(t.elem_type)),
+    RecordType: lambda t: (
+        RecordType,
+        tuple((name, id(type)) for name, type in t.fields),
+        tuple(t.display_order or ()),
+    ),
+}
+
+
+def intern_type(type: Type) -> Type:
+    """Return the shared instance structurally identical to type (type itself if it is the first)"""
+    if type.__class__ is NamedType:
+        return intern_named_type(type.name, type.lineno)
+    key = _INTERN_KEYS[type.__class__](type)
+    shared = _TYPE_CACHE.get(key)
+    if shared is None:
+        _TYPE_CACHE[key] = type
+        return type
+    return shared
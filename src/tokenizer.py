@@ -1,10 +1,11 @@
 import re
-from enum import Enum, auto
-from dataclasses import dataclass
+import sys
+from bisect import bisect_right
+from enum import Enum, IntEnum, auto
 from typing import List
 
 
-class TokenType(Enum):
+class TokenType(IntEnum):
     NUMBER = auto()
     STRING = auto()
     IDENT = auto()
@@ -54,55 +55,152 @@ class TokenType(Enum):
     MISMATCH = auto()
     EOF = auto()
 
+    # 比较与哈希按 int 进行，打印时仍显示为 TokenType.XXX
+    __str__ = Enum.__str__
+    __format__ = Enum.__format__
+
 
-@dataclass(repr=True)
 class Token:
-    type: TokenType
-    value: str
-    line: int
-    column: int
-
-
-_token_spec = {
-    TokenType.NUMBER: r"\d+(\.\d+)?",
-    TokenType.STRING: r'"[^"\n]*"|\'[^\'\n]*\'',
-    TokenType.COMMENT: r"//[^\n]*",
-    TokenType.ARROW: r"->",
-    TokenType.EQ: r"==",
-    TokenType.NEQ: r"!=",
-    TokenType.LEQ: r"<=",
-    TokenType.GEQ: r">=",
-    TokenType.LPAREN: r"\(",
-    TokenType.RPAREN: r"\)",
-    TokenType.LBRACKET: r"\[",
-    TokenType.RBRACKET: r"\]",
-    TokenType.LBRACE: r"\{",
-    TokenType.RBRACE: r"\}",
-    TokenType.DOT: r"\.",
-    TokenType.COMMA: r",",
-    TokenType.COLON: r":",
-    TokenType.SEMICOLON: r";",
-    TokenType.ASSIGN: r"=",
-    TokenType.LT: r"<",
-    TokenType.GT: r">",
-    TokenType.ADD: r"\+",
-    TokenType.SUB: r"-",
-    TokenType.MULT: r"\*",
-    TokenType.DIV: r"/",
-    TokenType.MOD: r"%",
-    TokenType.AND: r"&&",
-    TokenType.OR: r"\|\|",
-    TokenType.NOT: r"!",
-    TokenType.BACKSLASH: r"\\",
-    TokenType.AT: r"@",
-    TokenType.IDENT: r"[a-zA-Z_][a-zA-Z0-9_]*",
-    TokenType.WHITESPACE: r"[ \t\r\n]+",
-    TokenType.MISMATCH: r".",
+    """
+    只记录 token 在源码中的偏移量 offset，行号与列号在用到时
+    通过 newline_offsets（源码中所有换行符的位置）二分查找得到
+    """
+
+    __slots__ = ("type", "value", "offset", "_newlines", "_line")
+
+    def __init__(
+        self, type: TokenType, value: str, offset: int, newline_offsets: List[int], line=None
+    ):
+        self.type = type
+        self.value = value
+        self.offset = offset
+        self._newlines = newline_offsets
+        self._line = line
+
+    @property
+    def line(self) -> int:
+        # parser 的每一层都会读取 cur_line，这里缓存结果
+        if self._line is None:
+            self._line = bisect_right(self._newlines, self.offset) + 1
+        return self._line
+
+    @property
+    def column(self) -> int:
+        line_idx = self.line - 1
+        line_start = self._newlines[line_idx - 1] + 1 if line_idx > 0 else 0
+        return self.offset - line_start + 1  # 从1开始算列
+
+    def __repr__(self):
+        return f"Token(type={self.type!r}, value={self.value!r}, line={self.line!r}, column={self.column!r})"
+
+
+# 手写扫描器：按 token 首字符查表分派，每个 scanner 返回 (token_type, end)
+# 单字符与双字符符号优先级与原正则一致：COMMENT > 双字符运算符 > 单字符运算符
+
+_two_char_ops = {
+    "->": TokenType.ARROW,
+    "==": TokenType.EQ,
+    "!=": TokenType.NEQ,
+    "<=": TokenType.LEQ,
+    ">=": TokenType.GEQ,
+    "&&": TokenType.AND,
+    "||": TokenType.OR,
+}
+
+_one_char_ops = {
+    "(": TokenType.LPAREN,
+    ")": TokenType.RPAREN,
+    "[": TokenType.LBRACKET,
+    "]": TokenType.RBRACKET,
+    "{": TokenType.LBRACE,
+    "}": TokenType.RBRACE,
+    ".": TokenType.DOT,
+    ",": TokenType.COMMA,
+    ":": TokenType.COLON,
+    ";": TokenType.SEMICOLON,
+    "=": TokenType.ASSIGN,
+    "<": TokenType.LT,
+    ">": TokenType.GT,
+    "+": TokenType.ADD,
+    "-": TokenType.SUB,
+    "*": TokenType.MULT,
+    "/": TokenType.DIV,
+    "%": TokenType.MOD,
+    "!": TokenType.NOT,
+    "\\": TokenType.BACKSLASH,
+    "@": TokenType.AT,
 }
 
-# 合成正则表达式
-_token_regex = "|".join(f"(?P<{tok.name}>{pattern})" for tok, pattern in _token_spec.items())
-_master_pattern = re.compile(_token_regex)
+_ident_rest = re.compile(r"[a-zA-Z0-9_]*")
+_number_rest = re.compile(r"\d*(\.\d+)?")
+_whitespace_rest = re.compile(r"[ \t\r\n]*")
+
+
+# 空白与标识符在 tokenize 中内联扫描，分派表中只放标记
+_WHITESPACE = object()
+_IDENT = object()
+
+
+def _scan_number(code: str, i: int):
+    return TokenType.NUMBER, _number_rest.match(code, i + 1).end()
+
+
+def _scan_string(code: str, i: int):
+    quote = code[i]
+    end = code.find(quote, i + 1)
+    if end == -1:
+        return TokenType.MISMATCH, i + 1
+    newline = code.find("\n", i + 1, end)
+    if newline != -1:
+        return TokenType.MISMATCH, i + 1
+    return TokenType.STRING, end + 1
+
+
+def _scan_punct(code: str, i: int):
+    # 不可能是双字符运算符前缀的符号
+    return _one_char_ops[code[i]], i + 1
+
+
+def _scan_symbol(code: str, i: int):
+    token_type = _two_char_ops.get(code[i : i + 2])
+    if token_type is not None:
+        return token_type, i + 2
+    return _one_char_ops.get(code[i], TokenType.MISMATCH), i + 1
+
+
+def _scan_slash(code: str, i: int):
+    if code.startswith("//", i):
+        end = code.find("\n", i)
+        return TokenType.COMMENT, len(code) if end == -1 else end
+    return TokenType.DIV, i + 1
+
+
+def _scan_other(code: str, i: int):
+    # \d 也匹配非 ASCII 数字
+    if code[i].isdecimal():
+        return _scan_number(code, i)
+    return TokenType.MISMATCH, i + 1
+
+
+def _build_dispatch():
+    dispatch = [_scan_other] * 256
+    for c in " \t\r\n":
+        dispatch[ord(c)] = _WHITESPACE
+    for c in "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_":
+        dispatch[ord(c)] = _IDENT
+    for c in "0123456789":
+        dispatch[ord(c)] = _scan_number
+    for c in "\"'":
+        dispatch[ord(c)] = _scan_string
+    for c in _one_char_ops:
+        dispatch[ord(c)] = _scan_punct
+    for c in {op[0] for op in _two_char_ops}:
+        dispatch[ord(c)] = _scan_symbol
+    dispatch[ord("/")] = _scan_slash
+    return dispatch
+
+
+_DISPATCH = _build_dispatch()
 
 _key_words = {
     "true": TokenType.TRUE,
@@ -120,43 +218,63 @@ _key_words = {
     "type": TokenType.TYPE,
 }
 
+# 关键字的 value 统一使用驻留字符串，parser 中的比较可以走指针相等
+_key_word_values = {k: sys.intern(k) for k in _key_words}
+
+# 大多数标识符不是关键字：首字符或长度对不上时跳过字典查找
+_key_word_first = [any(ord(k[0]) == c for k in _key_words) for c in range(256)]
+_key_word_lens = frozenset(len(k) for k in _key_words)
+
 
 class TokenStream:
-    def __init__(self, tokens: List[Token]):
+    def __init__(self, tokens: List[Token], newline_offsets: List[int] = None):
         self.tokens = tokens
+        self._n = len(tokens)
+        self.newline_offsets = newline_offsets if newline_offsets is not None else []
         self.pos = 0
+        # EOF 位于最后一个 token 之后的同一行
         if len(tokens) == 0:
-            self.eof_token = Token(TokenType.EOF, "EOF", 0, 0)
+            self.eof_token = Token(TokenType.EOF, "EOF", 0, self.newline_offsets, line=0)
         else:
             self.eof_token = Token(
-                TokenType.EOF, "EOF", tokens[-1].line, tokens[-1].column + len(tokens[-1].value)
+                TokenType.EOF,
+                "EOF",
+                tokens[-1].offset + len(tokens[-1].value),
+                self.newline_offsets,
+                line=tokens[-1].line,
             )
 
     def eof(self):
-        return self.pos >= len(self.tokens)
+        return self.pos >= self._n
 
     def peek(self):
-        if self.eof():
-            return self.eof_token
-        return self.tokens[self.pos]
+        return self.tokens[self.pos] if self.pos < self._n else self.eof_token
 
     def peek_forward(self, n):
-        if self.pos + n >= len(self.tokens) or self.pos + n < 0:
+        if self.pos + n >= self._n or self.pos + n < 0:
             return self.eof_token
         return self.tokens[self.pos + n]
 
     def next(self):
-        if self.eof():
+        pos = self.pos
+        if pos >= self._n:
             return self.eof_token
-        tok = self.tokens[self.pos]
-        self.pos += 1
+        self.pos = pos + 1
+        return self.tokens[pos]
+
+    def expect_one(self, expected_type):
+        """parser 中绝大多数调用只期望一种 token"""
+        tok = self.next()
+        if tok.type is not expected_type:
+            self.error(tok, f"Expected '{expected_type.name}', got '{tok.value}'")
         return tok
 
-    def expect(self, *expected_value):
+    def expect_set(self, expected_types):
+        """expected_types 为模块级 frozenset，按 token 类型顺序报错"""
         tok = self.next()
-        if tok is None or tok.type not in expected_value:
-            expects = ", ".join(f"'{v.name}'" for v in expected_value)
-            self.error(tok, f"Expected {expects}, got '{tok.value if tok else 'EOF'}'")
+        if tok.type not in expected_types:
+            expects = ", ".join(f"'{v.name}'" for v in sorted(expected_types))
+            self.error(tok, f"Expected {expects}, got '{tok.value}'")
         return tok
 
     def expect_type(self, expected_type):
@@ -192,33 +310,63 @@ class TokenStream:
         return self.peek().line
 
 
+def _newline_offsets(code: str) -> List[int]:
+    offsets = []
+    i = code.find("\n")
+    while i != -1:
+        offsets.append(i)
+        i = code.find("\n", i + 1)
+    return offsets
+
+
 def tokenize(code: str) -> TokenStream:
     tokens = []
-    line_num = 1
-    line_start = 0
-
-    for mo in _master_pattern.finditer(code):
-        kind = mo.lastgroup
-        value = mo.group()
-        column = mo.start() - line_start + 1  # 从1开始算列
+    newlines = _newline_offsets(code)
+    i = 0
+    n = len(code)
 
-        # 计算行号
-        if "\n" in value:
-            line_num += value.count("\n")
-            line_start = mo.end() - (value[::-1].find("\n"))
+    # 循环内不再访问 TokenType 的类属性
+    COMMENT, MISMATCH = TokenType.COMMENT, TokenType.MISMATCH
+    STRING, IDENT = TokenType.STRING, TokenType.IDENT
+    intern = sys.intern
+    dispatch = _DISPATCH
+    skip_whitespace = _whitespace_rest.match
+    match_ident = _ident_rest.match
+    kw_first, kw_lens = _key_word_first, _key_word_lens
+    append = tokens.append
 
-        token_type = TokenType[kind]
+    while i < n:
+        ch = ord(code[i])
+        scan = dispatch[ch] if ch < 256 else _scan_other
 
-        if token_type in {TokenType.WHITESPACE, TokenType.COMMENT}:
+        # 内联最常见的两类 token，省去一次函数调用
+        if scan is _WHITESPACE:
+            i = skip_whitespace(code, i + 1).end()
+            continue
+        elif scan is _IDENT:
+            end = match_ident(code, i + 1).end()
+            value = code[i:end]
+            if kw_first[ch] and end - i in kw_lens and value in _key_words:
+                append(Token(_key_words[value], _key_word_values[value], i, newlines))
+            else:
+                append(Token(IDENT, intern(value), i, newlines))
+            i = end
             continue
-        elif token_type == TokenType.MISMATCH:
-            raise SyntaxError(f"[Line {line_num}] Syntax Error: Unexpected character {value!r}")
+
+        token_type, end = scan(code, i)
+
+        if token_type is COMMENT:
+            pass
+        elif token_type is MISMATCH:
+            line_num = bisect_right(newlines, i) + 1
+            raise SyntaxError(f"[Line {line_num}] Syntax Error: Unexpected character {code[i]!r}")
         else:
-            if value in _key_words:
-                token_type = _key_words[value]
-            if token_type == TokenType.STRING:
+            # 标识符与关键字都在上面的分支处理
+            value = code[i:end]
+            if token_type is STRING:
                 value = value[1:-1]
                 value = value.replace("\\n", "\n")
-            tokens.append(Token(token_type, value, line_num, column))
+            append(Token(token_type, value, i, newlines))
+        i = end
 
-    return TokenStream(tokens)
+    return TokenStream(tokens, newlines)
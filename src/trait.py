@@ -25,13 +25,14 @@ class TraitVisitor(TransformVisitor):
         stmts = []
 
         # record body
-        record_type = RecordType({})
+        record_fields = {}
         for item in node.items:
-            if item.name in record_type.fields:
+            if item.name in record_fields:
                 self._error(node, f"Duplicate field name '{item.name}'")
-            record_type.fields[item.name] = item.type
+            record_fields[item.name] = item.type
+        record_type = RecordType.from_items(record_fields.items())
         # for all record type
-        for_all_type = ForAllType(node.type_params[0], record_type, trait_bounds=[node.name])
+        for_all_type = intern_type(ForAllType(node.type_params[0], record_type, [node.name]))
         # type definition
         type_def = TypeAssignStmt(node.name, for_all_type, lineno=node.lineno)
         stmts.append(type_def)
@@ -42,12 +43,7 @@ class TraitVisitor(TransformVisitor):
             trait_field_env = TraitFieldEnvStmt(
                 field_name=item.name,
                 trait_name=node.name,
-                type=ForAllType(
-                    param_name=node.type_params[0],
-                    body=item.type,
-                    trait_bounds=[node.name],
-                    lineno=node.lineno,
-                ),
+                type=intern_type(ForAllType(node.type_params[0], item.type, [node.name])),
                 lineno=node.lineno,
             )
             stmts.append(trait_field_env)
@@ -55,25 +51,24 @@ class TraitVisitor(TransformVisitor):
         return stmts
 
     def visit_StructStmt(self, node: StructStmt):
-        # record body
-        record_type = RecordType({})
-        for item in node.items:
-            if item.name in record_type.fields:
+        # record body 与 constructor 的 record 字段一次遍历构造
+        record_fields = {}
+        expr_fields = []
+        for i, item in enumerate(node.items):
+            if item.name in record_fields:
                 self._error(node, f"Duplicate field name '{item.name}'")
-            record_type.fields[item.name] = item.type
+            record_fields[item.name] = item.type
+            expr_fields.append((item.name, NamedExpr(f"__x{i}")))
+        record_type = RecordType.from_items(record_fields.items())
 
         # type definition
         type_def = TypeAssignStmt(node.name, record_type, lineno=node.lineno)
 
         # constructor
         # S = \x1. \x2. {f1=x1, f2=x2}
-        lambda_params = [NamedExpr(f"__x{i}") for i in range(len(node.items))]
-        lambda_types = [item.type for item in node.items]
-        lambda_expr = RecordExpr(
-            {item.name: lambda_params[i] for i, item in enumerate(node.items)},
-        )
-        for l_param, l_type in reversed(list(zip(lambda_params, lambda_types))):
-            lambda_expr = LambdaExpr(l_param.name, l_type, lambda_expr)
+        lambda_expr = RecordExpr(tuple(expr_fields))
+        for i in range(len(node.items) - 1, -1, -1):
+            lambda_expr = LambdaExpr(f"__x{i}", node.items[i].type, lambda_expr)
 
         constructor_def = AssignStmt(node.name, lambda_expr, lineno=node.lineno)
 
@@ -87,11 +82,11 @@ class TraitVisitor(TransformVisitor):
         存储 Show[Int] = __show_inst_x
         """
 
-        trait_forall_type = NamedType(node.name)
+        trait_forall_type = intern_named_type(node.name)
         # for exaultiveness check + integrity check
-        expected_trait_impl_type = AppType(trait_forall_type, node.type_param)
+        expected_trait_impl_type = intern_type(AppType(trait_forall_type, node.type_param))
 
-        dict_inst = RecordExpr({item.name: item.value for item in node.items})
+        dict_inst = RecordExpr(tuple((item.name, item.value) for item in node.items))
 
         inst_name = f"__{node.name}_inst_{self.inst_idx}"
         self.inst_idx += 1
@@ -4,7 +4,7 @@ from .parser import *
 from .visitor import NodeVisitor
 from .env import Env
 from .builtin import BoolType, IntType, StringType, TypeType, built_in_funcs
-from .type_solver import TypeSubstitutionVisitor
+from .type_solver import apply_forall
 
 
 """
@@ -12,32 +12,66 @@ No TraitStmt, StructStmt, ImplStmt here
 """
 
 
+# 按 type(value) 查表，bool 不会落到 int 上
+_value_types = {bool: BoolType, int: IntType, str: StringType}
+
+
 class TypeCheckerVisitor(NodeVisitor):
     def __init__(self):
         super().__init__()
 
-        # global_env 中包含 assignment bindings 和 trait fields
-        self.global_env: Env = Env()  # expr |-> type
-        self.cur_env = self.global_env
+        # 最外层作用域中包含 assignment bindings 和 trait fields
+        # lambda / type lambda 的参数绑定在 push_frame 的内层作用域中
+        self.env: Env = Env()  # expr |-> type
 
         self.get_inst_types: dict[str, list[Type]] = {}  # trait_name |-> set of inst_types
+        # get_inst_types 每次变化时加一，用于判断下面的缓存是否过期
+        self._inst_version = 0
+        # trait_bounds |-> (version, 满足所有 bound 的 inst_types 并集)
+        self._bound_inst_cache: dict[tuple[str, ...], tuple[int, frozenset]] = {}
 
-        with open("step3_type_checked.rs", "w", encoding="utf-8"):
-            pass
+        # (id(src), id(param), id(tgt)) |-> (src, param, tgt, unified)
+        # 保留三个类型的引用，保证 id 在缓存期间有效
+        self._unify_cache: dict[tuple[int, int, int], tuple] = {}
+
+        # step3_type_checked.rs 的内容先缓存在这里，检查结束（或出错）时一次写出
+        # 记录 (stmt, type)，写出时才格式化
+        self._log_entries: list[tuple[Stmt, Type]] = []
 
         for func, (type, _) in built_in_funcs.items():
-            self.global_env.set(name=func, value=type)
+            self.env.set(name=func, value=type)
 
     def _log(self, stmt, type):
-        with open("step3_type_checked.rs", "a", encoding="utf-8") as f:
-            if type is not None:
-                f.write(f"{stmt} // : {type}\n")
-            else:
-                f.write(f"{stmt}\n")
+        self._log_entries.append((stmt, type))
+
+    def _flush_log(self):
+        with open("step3_type_checked.rs", "w", encoding="utf-8") as f:
+            for stmt, type in self._log_entries:
+                if type is not None:
+                    f.write(f"{stmt} // : {type}\n")
+                else:
+                    f.write(f"{stmt}\n")
 
     def _error(self, node: ASTNode, msg: str) -> NoReturn:
         raise TypeError(f"[Line {node.lineno}] Type Error: {msg}")
 
+    def _binop(self, node: ASTNode, operand_type: Type, result_type: Type) -> Type:
+        # 两侧操作数都必须是 operand_type 的二元运算
+        left_type = self.visit(node.left)
+        right_type = self.visit(node.right)
+        if left_type is not operand_type or right_type is not operand_type:
+            self._error(node, f"Expected '{operand_type}', got '{left_type}' and '{right_type}'")
+        return result_type
+
+    def _unify(self, src_type: Type, type_param: NamedType, tgt_type: Type) -> Type:
+        # 类型已 intern，同一泛型函数作用于同类实参时命中
+        key = (id(src_type), id(type_param), id(tgt_type))
+        entry = self._unify_cache.get(key)
+        if entry is None:
+            entry = (src_type, type_param, tgt_type, simple_unify(src_type, type_param, tgt_type))
+            self._unify_cache[key] = entry
+        return entry[3]
+
     ###############################################################
 
     def visit(self, node: ASTNode):
@@ -45,9 +79,15 @@ class TypeCheckerVisitor(NodeVisitor):
         node.checked_type = type
         return type
 
+    def visit_Program(self, node: Program):
+        try:
+            self.generic_visit(node)
+        finally:
+            self._flush_log()
+
     def visit_AssignStmt(self, node: AssignStmt):
         stmt_type = self.visit(node.expr)
-        self.global_env.set(name=node.name, value=stmt_type)
+        self.env.set(name=node.name, value=stmt_type)
         self._log(node, stmt_type)
 
     def visit_ExprStmt(self, node: ExprStmt):
@@ -55,116 +95,101 @@ class TypeCheckerVisitor(NodeVisitor):
         self._log(node, expr_type)
 
     def visit_TraitFieldEnvStmt(self, node: TraitFieldEnvStmt):
-        self.global_env.set(name=node.field_name, value=node.type)
+        self.env.set(name=node.field_name, value=node.type)
         self._log(node, None)
 
     def visit_InstanceEnvStmt(self, node: InstanceEnvStmt):
         self.get_inst_types.setdefault(node.name, []).append(node.type_param)
+        self._inst_version += 1
         self._log(node, None)
 
     def visit_Expr(self, node: Expr):
         return self.visit(node.expr)
 
     def visit_LambdaExpr(self, node: LambdaExpr):
-        old_env = self.cur_env
-        self.cur_env = Env(self.cur_env)
-
-        self.cur_env.set(name=node.param_name, value=node.param_type)
+        self.env.push_frame()
+        self.env.set(name=node.param_name, value=node.param_type)
 
         body_type = self.visit(node.body)
 
-        self.cur_env = old_env
-        return ArrowType(node.param_type, body_type)
+        self.env.pop_frame()
+        return intern_type(ArrowType(node.param_type, body_type))
 
     def visit_TypeLambdaExpr(self, node: TypeLambdaExpr):
-        old_env = self.cur_env
-        self.cur_env = Env(self.cur_env)
-        self.cur_env.set(name=node.param_name, value=TypeType)
+        self.env.push_frame()
+        self.env.set(name=node.param_name, value=TypeType)
 
         if len(node.trait_bounds) > 0:
             for trait in node.trait_bounds:
                 self.get_inst_types.setdefault(trait, []).append(NamedType(node.param_name))
+            self._inst_version += 1
 
         body_type = self.visit(node.body)
 
         if len(node.trait_bounds) > 0:
             for trait in node.trait_bounds:
                 self.get_inst_types[trait].pop()
+            self._inst_version += 1
 
-        self.cur_env = old_env
-        return ForAllType(node.param_name, body_type, trait_bounds=node.trait_bounds)
+        self.env.pop_frame()
+        return intern_type(
+            ForAllType(node.param_name, body_type, trait_bounds=node.trait_bounds)
+        )
 
     def visit_IfExpr(self, node: IfExpr):
         cond_type = self.visit(node.condition)
         if_type = self.visit(node.then_expr)
         else_type = self.visit(node.else_expr)
 
-        if cond_type != BoolType:
-            self._error(node.cond, f"Expected 'Bool', got '{cond_type}'")
+        if cond_type is not BoolType:
+            self._error(node.condition, f"Expected 'Bool', got '{cond_type}'")
 
-        if if_type != else_type:
+        if if_type is not else_type and if_type != else_type:
             self._error(node, f"Expected '{if_type}', got '{else_type}'")
 
         return if_type
 
     def visit_LogicOrExpr(self, node: LogicOrExpr):
-        left_type = self.visit(node.left)
-        right_type = self.visit(node.right)
-        if left_type != BoolType or right_type != BoolType:
-            self._error(node, f"Expected 'Bool', got '{left_type}' and '{right_type}'")
-        return BoolType
+        return self._binop(node, BoolType, BoolType)
 
     def visit_LogicAndExpr(self, node: LogicAndExpr):
-        left_type = self.visit(node.left)
-        right_type = self.visit(node.right)
-        if left_type != BoolType or right_type != BoolType:
-            self._error(node, f"Expected 'Bool', got '{left_type}' and '{right_type}'")
-        return BoolType
+        return self._binop(node, BoolType, BoolType)
 
     def visit_LogicNotExpr(self, node: LogicNotExpr):
         expr_type = self.visit(node.expr)
-        if expr_type != BoolType:
+        if expr_type is not BoolType:
             self._error(node, f"Expected 'Bool', got '{expr_type}'")
         return BoolType
 
     def visit_RelExpr(self, node: RelExpr):
+        if node.op not in ("==", "!="):
+            return self._binop(node, IntType, BoolType)
+
         left_type = self.visit(node.left)
         right_type = self.visit(node.right)
-
-        if node.op in ("==", "!="):
-            if left_type != right_type:
-                self._error(node, f"Expected '{left_type}', got '{right_type}'")
-        else:
-            if left_type != IntType or right_type != IntType:
-                self._error(node, f"Expected 'Int', got '{left_type}' and '{right_type}'")
-
+        if left_type is not right_type and left_type != right_type:
+            self._error(node, f"Expected '{left_type}', got '{right_type}'")
         return BoolType
 
     def visit_AddExpr(self, node: AddExpr):
+        if node.op != "+":
+            return self._binop(node, IntType, IntType)
+
         left_type = self.visit(node.left)
         right_type = self.visit(node.right)
-        if node.op == "+":
-            if left_type != right_type:
-                self._error(node, f"Expected '{left_type}', got '{right_type}'")
-            if left_type in (IntType, StringType) or isinstance(left_type, ListType):
-                return left_type
-            else:
-                self._error(node, f"Expected 'Int' or 'String' or List, got '{left_type}'")
+        if left_type is not right_type and left_type != right_type:
+            self._error(node, f"Expected '{left_type}', got '{right_type}'")
+        if left_type is IntType or left_type is StringType or isinstance(left_type, ListType):
+            return left_type
         else:
-            if left_type != IntType or right_type != IntType:
-                self._error(node, f"Expected 'Int', got '{left_type}' and '{right_type}'")
-            return IntType
+            self._error(node, f"Expected 'Int' or 'String' or List, got '{left_type}'")
 
     def visit_MulExpr(self, node: MulExpr):
-        left_type = self.visit(node.left)
-        right_type = self.visit(node.right)
-        if left_type != IntType or right_type != IntType:
-            self._error(node, f"Expected 'Int', got '{left_type}' and '{right_type}'")
-        return IntType
+        return self._binop(node, IntType, IntType)
 
     def visit_NegExpr(self, node: NegExpr):
         expr_type = self.visit(node.expr)
-        if expr_type != IntType:
+        if expr_type is not IntType:
             self._error(node, f"Expected 'Int', got '{expr_type}'")
         return IntType
 
@@ -174,11 +199,11 @@ class TypeCheckerVisitor(NodeVisitor):
         if not isinstance(record_type, RecordType):
             self._error(node, f"Expected record, got '{record_type}'")
 
-        if node.field_name not in record_type.fields:
+        field_type = record_type.get_field(node.field_name)
+        if field_type is None:
             self._error(node, f"Unknown field '{node.field_name}' in {record_type}")
-        record_type = record_type.fields[node.field_name]
 
-        return record_type
+        return field_type
 
     def visit_AppExpr(self, node: AppExpr):
         func_type = self.visit(node.func)
@@ -188,25 +213,28 @@ class TypeCheckerVisitor(NodeVisitor):
         # id 1         App(id, 1)
         # =>
         # id @Int 1    App(TApp(id, Int), 1)
-        if isinstance(func_type, ForAllType):
+        # 推断出的类型参数直接作用在已知的 func_type 上，func 与 arg 不再重新遍历
+        while isinstance(func_type, ForAllType):
+            inferred = None
             if isinstance(func_type.body, ArrowType):
-                inferred = simple_unify(
+                inferred = self._unify(
                     src_type=func_type.body.left,
                     tgt_type=arg_type,
-                    type_param=NamedType(func_type.param_name),
+                    type_param=intern_named_type(func_type.param_name),
                 )
-                if inferred is not None:
-                    node.func = TypeAppExpr(node.func, inferred, lineno=node.lineno)
-                    return self.visit(node)
-
-            self._error(
-                node, f"Type infer failed for '{func_type}' with argument type '{arg_type}'"
-            )
+            if inferred is None:
+                self._error(
+                    node, f"Type infer failed for '{func_type}' with argument type '{arg_type}'"
+                )
+            type_app = TypeAppExpr(node.func, inferred, lineno=node.lineno)
+            func_type = self._apply_type_arg(type_app, func_type)
+            type_app.checked_type = func_type
+            node.func = type_app
 
         if not isinstance(func_type, ArrowType):
             self._error(node, f"Arrow type expected, got '{func_type}'")
 
-        if func_type.left != arg_type:
+        if func_type.left is not arg_type and func_type.left != arg_type:
             self._error(node, f"Expected '{func_type.left}', got '{arg_type}'")
 
         return func_type.right
@@ -215,32 +243,38 @@ class TypeCheckerVisitor(NodeVisitor):
         forall_type = self.visit(node.func)
         if not isinstance(forall_type, ForAllType):
             self._error(node, f"For-all type expected, got '{forall_type}'")
-
+        return self._apply_type_arg(node, forall_type)
+
+    def _bound_inst_types(self, trait_bounds: list[str]) -> frozenset:
+        key = tuple(trait_bounds)
+        cached = self._bound_inst_cache.get(key)
+        if cached is not None and cached[0] == self._inst_version:
+            return cached[1]
+        inst_types = frozenset(t for bound in trait_bounds for t in self.get_inst_types[bound])
+        self._bound_inst_cache[key] = (self._inst_version, inst_types)
+        return inst_types
+
+    def _apply_type_arg(self, node: TypeAppExpr, forall_type: ForAllType) -> Type:
         if len(forall_type.trait_bounds) > 0:
-            inst_types = set()
-            for bound in forall_type.trait_bounds:
-                inst_types.update(self.get_inst_types[bound])
+            inst_types = self._bound_inst_types(forall_type.trait_bounds)
             if node.type_arg not in inst_types:
                 self._error(
                     node,
                     f"Type '{node.type_arg}' does not satisfy trait bounds '{" + ".join(forall_type.trait_bounds)}' required by '{node.func}'",
                 )
 
-        return TypeSubstitutionVisitor(
-            old=NamedType(forall_type.param_name),
-            new=node.type_arg,
-        ).visit(forall_type.body)
+        return apply_forall(forall_type, node.type_arg)
 
     def visit_TypeAnnotatedExpr(self, node: TypeAnnotatedExpr):
         expr_type = self.visit(node.expr)
-        if expr_type != node.type:
+        if expr_type is not node.type and expr_type != node.type:
             self._error(node, f"Annotated type '{node.type}', got '{expr_type}'")
         return expr_type
 
     def visit_NamedExpr(self, node: NamedExpr):
         try:
-            type = self.cur_env.get(node.name)
-            if type == TypeType:
+            type = self.env.get(node.name)
+            if type is TypeType:
                 self._error(node, f"Identifier '{node.name}' is a type, not a variable")
             return type
         except NameError as e:
@@ -248,38 +282,36 @@ class TypeCheckerVisitor(NodeVisitor):
 
     def visit_ValueExpr(self, node: ValueExpr):
         value = node.value
-        if isinstance(value, bool):
-            return BoolType
-        elif isinstance(value, int):
-            return IntType
-        elif isinstance(value, str):
-            return StringType
-        else:
-            self._error(value, f"Unknown value type '{type(value)}'")
+        value_type = _value_types.get(value.__class__)
+        if value_type is None:
+            self._error(node, f"Unknown value type '{type(value)}'")
+        return value_type
 
     def visit_ListExpr(self, node: ListExpr):
         if len(node.elements) == 0:
             # return ForAllType("a", ListType(NamedType("a")), trait_bounds=[])
-            return ListType(None)
+            return intern_type(ListType(None))
 
-        first_type = self.visit(node.elements[0])
-        for value in node.elements[1:]:
+        elements = iter(node.elements)
+        first_type = self.visit(next(elements))
+        for value in elements:
             value_type = self.visit(value)
-            if first_type != value_type:
+            if value_type is not first_type and value_type != first_type:
                 self._error(value, f"Expected '{first_type}', got '{value_type}'")
 
-        return ListType(first_type)
+        return intern_type(ListType(first_type))
 
     def visit_RecordExpr(self, node: RecordExpr):
-        record_type = RecordType({label: self.visit(value) for label, value in node.fields.items()})
-        return record_type
+        return intern_type(
+            RecordType.from_items([(label, self.visit(value)) for label, value in node.fields])
+        )
 
 
 def simple_unify(src_type: Type, type_param: Type, tgt_type: Type) -> Type:
     assert isinstance(type_param, NamedType)
 
     # X
-    if isinstance(src_type, NamedType) and src_type == type_param:
+    if src_type is type_param or (isinstance(src_type, NamedType) and src_type == type_param):
         return tgt_type
 
     # X -> X
@@ -295,15 +327,18 @@ def simple_unify(src_type: Type, type_param: Type, tgt_type: Type) -> Type:
 
     # Record
     if isinstance(src_type, RecordType) and isinstance(tgt_type, RecordType):
-        if src_type.fields.keys() != tgt_type.fields.keys():
+        if len(src_type.fields) != len(tgt_type.fields):
             return None
         last_unified = None
-        for label, src_field_type in src_type.fields.items():
-            tgt_field_type = tgt_type.fields[label]
+        for (label, src_field_type), (tgt_label, tgt_field_type) in zip(
+            src_type.fields, tgt_type.fields
+        ):
+            if label != tgt_label:
+                return None
             unified = simple_unify(src_field_type, type_param, tgt_field_type)
             if unified is None:
                 return None
-            if last_unified is not None and last_unified != unified:
+            if last_unified is not None and last_unified is not unified and last_unified != unified:
                 return None
             last_unified = unified
         return last_unified
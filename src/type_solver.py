@@ -1,8 +1,9 @@
 from typing import NoReturn
 
-from .visitor import TransformVisitor, NodeVisitor
+from .visitor import TransformVisitor
 from .parser import *
 from .builtin import is_built_in_type
+from .env import BoundNames
 from dataclasses import replace
 
 
@@ -10,65 +11,106 @@ class TypeSolverVisitor(TransformVisitor):
     def __init__(self):
         super().__init__()
         self.global_var_dict = {}  # name |-> type
-        self.bounded_var_names = []
+        self.bounded_var_names = BoundNames()
+
+        # id(type node) |-> (type node, solved type)
+        # trait 展开出的类型与 parser 中的 NamedType 是共享的，同一节点会被多次访问
+        # 只缓存不在任何绑定之内解出的结果；global_var_dict 变化时清空
+        self._solved: dict[int, tuple[Type, Type]] = {}
+
+        # 当前所在 stmt / expr 的行号
+        # trait 展开与 intern 产生的类型节点没有 lineno，报错时退回到这里
+        self.cur_lineno = None
+
+    def _lineno(self, node: ASTNode) -> int:
+        return node.lineno if node.lineno is not None else self.cur_lineno
 
     def _error(self, node: ASTNode, msg: str) -> NoReturn:
-        raise TypeError(f"[Line {node.lineno}] Type Error: {msg}")
+        raise TypeError(f"[Line {self._lineno(node)}] Type Error: {msg}")
+
+    def visit(self, node: ASTNode):
+        if not isinstance(node, Type):
+            outer_lineno = self.cur_lineno
+            if node.lineno is not None:
+                self.cur_lineno = node.lineno
+            result = super().visit(node)
+            self.cur_lineno = outer_lineno
+            return result
+        if len(self.bounded_var_names) > 0:
+            return super().visit(node)
+        entry = self._solved.get(id(node))
+        if entry is None:
+            entry = (node, super().visit(node))
+            self._solved[id(node)] = entry
+        return entry[1]
 
     def visit_TypeAssignStmt(self, node: TypeAssignStmt):
         self.global_var_dict[node.name] = self.visit(node.type)
+        self._solved.clear()
         return None
 
     def visit_LambdaExpr(self, node: LambdaExpr):
-        self.bounded_var_names.append(node.param_name)
+        self.bounded_var_names.bind(node.param_name)
         param_type = self.visit(node.param_type)
         body = self.visit(node.body)
-        self.bounded_var_names.pop()
+        self.bounded_var_names.unbind(node.param_name)
+        if param_type is node.param_type and body is node.body:
+            return node
         return replace(node, param_type=param_type, body=body)
 
     def visit_TypeLambdaExpr(self, node: TypeLambdaExpr):
-        self.bounded_var_names.append(node.param_name)
+        self.bounded_var_names.bind(node.param_name)
         body = self.visit(node.body)
-        self.bounded_var_names.pop()
+        self.bounded_var_names.unbind(node.param_name)
+        if body is node.body:
+            return node
         return replace(node, body=body)
 
+    # 解出的类型自底向上 intern，type checker 中相同的类型大多是同一个实例
     def visit_ForAllType(self, node: ForAllType):
-        self.bounded_var_names.append(node.param_name)
+        self.bounded_var_names.bind(node.param_name)
         body = self.visit(node.body)
-        self.bounded_var_names.pop()
-        return replace(node, body=body)
+        self.bounded_var_names.unbind(node.param_name)
+        if body is node.body:
+            return intern_type(node)
+        return intern_type(replace(node, body=body))
 
     def visit_ArrowType(self, node: ArrowType):
         left_type = self.visit(node.left)
         right_type = self.visit(node.right)
-        return ArrowType(left_type, right_type)
+        if left_type is node.left and right_type is node.right:
+            return intern_type(node)
+        return intern_type(ArrowType(left_type, right_type))
 
     def visit_AppType(self, node: AppType):
         func_type = self.visit(node.func)
         type_arg = self.visit(node.arg)
         if not isinstance(func_type, ForAllType):
             self._error(node, f"For all type expected, got '{func_type}'")
-        app_result = TypeSubstitutionVisitor(
-            old=NamedType(func_type.param_name),
-            new=type_arg,
-        ).visit(func_type.body)
-        return app_result
+        return apply_forall(func_type, type_arg)
 
     def visit_NamedType(self, node: NamedType):
         if is_built_in_type(node):
-            return node
+            return intern_named_type(node.name)
         if node.name in self.bounded_var_names:
-            return node
+            return intern_named_type(node.name)
         elif node.name in self.global_var_dict:
             return self.global_var_dict[node.name]
         else:
-            raise TypeError(f"[Line {node.lineno}] Unknown type '{node.name}'")
+            raise TypeError(f"[Line {self._lineno(node)}] Unknown type '{node.name}'")
 
+    # 子类型都原样解出时直接 intern 原节点，不再新建
     def visit_ListType(self, node: ListType):
-        return ListType(self.visit(node.elem_type))
+        elem_type = self.visit(node.elem_type)
+        if elem_type is node.elem_type:
+            return intern_type(node)
+        return intern_type(ListType(elem_type))
 
     def visit_RecordType(self, node: RecordType):
-        return RecordType({label: self.visit(type) for label, type in node.fields.items()})
+        fields = tuple((label, self.visit(type)) for label, type in node.fields)
+        if all(new is old for (_, new), (_, old) in zip(fields, node.fields)):
+            return intern_type(node)
+        return intern_type(replace(node, fields=fields))
 
 
 _temp_name_idx = 0
@@ -82,9 +124,22 @@ def _new_temp_name(name: str) -> str:
 
 class TypeSubstitutionVisitor(TransformVisitor):
     def __init__(self, old: NamedType, new: Type):
+        self.reset(old, new)
+
+    def reset(self, old: NamedType, new: Type):
+        # 换一组 x := N 重新使用同一个 visitor
         assert isinstance(old, NamedType)
         self.old = old
         self.new = new
+        # name |-> type: x := N 以及 alpha-renaming 产生的 y := z
+        # 改名与替换在同一次遍历中完成
+        self.mapping: dict[str, Type] = {old.name: new}
+        self._new_free_vars: set[str] = None  # FV(new)，第一次遇到 forall 时计算
+
+    def _free_vars_of_new(self) -> set[str]:
+        if self._new_free_vars is None:
+            self._new_free_vars = _free_type_vars(self.new)
+        return self._new_free_vars
 
     def visit_ForAllType(self, node: ForAllType):
         """
@@ -92,40 +147,69 @@ class TypeSubstitutionVisitor(TransformVisitor):
         (λy. E)[x := N] = λy. E[x := N]  if y ∉ FV(N)
         (λy. E)[x := N] = λz. E[y := z][x := N]
         """
-        if node.param_name == self.old.name:
-            return node
-        elif node.param_name not in _FreeVarVisitor().visit(self.new):
-            return replace(node, body=self.visit(node.body))
-        else:
-            temp_name = _new_temp_name(node.param_name)
-            result_body = TypeSubstitutionVisitor(
-                NamedType(node.param_name), NamedType(temp_name)
-            ).visit(node.body)
-            result_body = self.visit(result_body)
-            return replace(node, param_name=temp_name, body=result_body)
-
-    def visit_NamedType(self, node: NamedType):
-        if node.name == self.old.name:
-            return self.new
-        else:
-            return node
-
-
-class _FreeVarVisitor(NodeVisitor):
-    def __init__(self):
-        super().__init__()
-        self.bound_var_names = []
-        self.free_vars = set()
-
-    def visit(self, node: ASTNode):
-        super().visit(node)
-        return self.free_vars
+        outer_mapping = self.mapping
+        mapping = outer_mapping
+        param_name = node.param_name
+        if param_name in mapping:
+            # 被 forall 重新绑定的名字在 body 中不再替换
+            mapping = {k: v for k, v in mapping.items() if k != param_name}
+            if len(mapping) == 0:
+                return node
+        if self.old.name in mapping and param_name in self._free_vars_of_new():
+            param_name = _new_temp_name(node.param_name)
+            mapping = {**mapping, node.param_name: intern_named_type(param_name)}
+
+        self.mapping = mapping
+        body = self.visit(node.body)
+        self.mapping = outer_mapping
+        if param_name == node.param_name and body is node.body:
+            return intern_type(node)
+        return intern_type(replace(node, param_name=param_name, body=body))
 
-    def visit_ForAllType(self, node: ForAllType):
-        self.bound_var_names.append(node.param_name)
-        self.visit(node.body)
-        self.bound_var_names.pop()
+    def generic_visit(self, node: ASTNode):
+        # ArrowType / AppType / ListType / RecordType
+        return intern_type(super().generic_visit(node))
 
     def visit_NamedType(self, node: NamedType):
-        if node.name not in self.bound_var_names:
-            self.free_vars.add(node.name)
+        return self.mapping.get(node.name, node)
+
+
+# apply_forall 共用的 visitor：替换过程中不会再嵌套调用 apply_forall
+_subst_visitor: TypeSubstitutionVisitor = None
+
+
+def apply_forall(forall_type: ForAllType, type_arg: Type) -> Type:
+    """(forall X. T) @N = T[X := N]"""
+    global _subst_visitor
+    old = intern_named_type(forall_type.param_name)
+    if _subst_visitor is None:
+        _subst_visitor = TypeSubstitutionVisitor(old, type_arg)
+    else:
+        _subst_visitor.reset(old, type_arg)
+    return _subst_visitor.visit(forall_type.body)
+
+
+def _free_type_vars(type: Type) -> set[str]:
+    # 显式栈代替递归，栈中每项为 (type, 此处被 forall 绑定的名字)
+    free_vars = set()
+    stack = [(type, frozenset())]
+    while stack:
+        node, bound = stack.pop()
+        if isinstance(node, NamedType):
+            if node.name not in bound:
+                free_vars.add(node.name)
+        elif isinstance(node, ForAllType):
+            stack.append((node.body, bound | {node.param_name}))
+        elif isinstance(node, ArrowType):
+            stack.append((node.left, bound))
+            stack.append((node.right, bound))
+        elif isinstance(node, AppType):
+            stack.append((node.func, bound))
+            stack.append((node.arg, bound))
+        elif isinstance(node, ListType):
+            if node.elem_type is not None:
+                stack.append((node.elem_type, bound))
+        elif isinstance(node, RecordType):
+            for _, field_type in node.fields:
+                stack.append((field_type, bound))
+    return free_vars
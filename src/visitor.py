@@ -1,64 +1,132 @@
 from .parser import *
 from dataclasses import fields, replace
+from typing import get_args, get_origin, get_type_hints
 
 
-class NodeVisitor:
+def _lookup_visitor(visitor_cls, node_cls):
+    # 每个 visitor 类各有一张 node class |-> 未绑定 visit 方法 的表，首次遇到时填入
+    method = getattr(visitor_cls, "visit_" + node_cls.__name__, visitor_cls.generic_visit)
+    visitor_cls._visit_table[node_cls] = method
+    return method
+
+
+class _DispatchVisitor:
+    # NodeVisitor 与 TransformVisitor 共用的分派：按 node class 查表，不再拼接方法名
+    _visit_table: dict = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._visit_table = {}
+
     def visit(self, node):
-        method = "visit_" + node.__class__.__name__
-        visitor = getattr(self, method, self.generic_visit)
-        return visitor(node)
+        visitor = self._visit_table.get(node.__class__)
+        if visitor is None:
+            visitor = _lookup_visitor(self.__class__, node.__class__)
+        return visitor(self, node)
 
+
+class NodeVisitor(_DispatchVisitor):
     def generic_visit(self, node):
-        for field, value in iter_fields(node):
-            if isinstance(value, (list, tuple, set)):
+        for field, kind in _field_kinds(node.__class__):
+            value = getattr(node, field)
+            if kind == _NODE:
+                if isinstance(value, ASTNode):
+                    self.visit(value)
+            elif kind == _NODE_LIST:
                 for item in value:
-                    if isinstance(item, ASTNode):
-                        self.visit(item)
-            elif isinstance(value, dict):
-                for v in value.values():
-                    if isinstance(v, ASTNode):
-                        self.visit(v)
-            elif isinstance(value, ASTNode):
-                self.visit(value)
-
+                    self.visit(item)
+            else:  # record fields
+                for _, v in value:
+                    self.visit(v)
 
-class TransformVisitor:
-    def visit(self, node):
-        method = "visit_" + node.__class__.__name__
-        visitor = getattr(self, method, self.generic_visit)
-        return visitor(node)
 
+class TransformVisitor(_DispatchVisitor):
     def generic_visit(self, node):
+        # 所有子节点都原样返回时不复制，直接返回 node
         updated_fields = {}
-        for field, value in iter_fields(node):
-            if isinstance(value, list) and len(value) > 0 and isinstance(value[0], ASTNode):
-                new_list = []
+        for field, kind in _field_kinds(node.__class__):
+            value = getattr(node, field)
+            if kind == _NODE:
+                if not isinstance(value, ASTNode):
+                    continue
+                new_value = self.visit(value)
+                if new_value is value or not isinstance(new_value, ASTNode):
+                    continue
+            elif kind == _NODE_LIST:
+                changed = False
+                new_value = []
                 for item in value:
                     new_item = self.visit(item)
+                    if new_item is item:
+                        new_value.append(item)
+                        continue
+                    changed = True
                     if isinstance(new_item, list):
-                        new_list.extend(new_item)
+                        new_value.extend(new_item)
                     elif isinstance(new_item, ASTNode):
-                        new_list.append(new_item)
-                updated_fields[field] = new_list
-            elif isinstance(value, dict):
-                new_dict = {}
-                for k, v in value.items():
+                        new_value.append(new_item)
+                if not changed:
+                    continue
+            else:  # record fields
+                changed = False
+                new_fields = []
+                for k, v in value:
                     new_v = self.visit(v)
+                    if new_v is not v:
+                        changed = True
                     if new_v is not None:
-                        new_dict[k] = new_v
-                updated_fields[field] = new_dict
-            elif isinstance(value, ASTNode):
-                new_node = self.visit(value)
-                if isinstance(new_node, ASTNode):
-                    updated_fields[field] = new_node
-            else:
-                updated_fields[field] = value
+                        new_fields.append((k, new_v))
+                if not changed:
+                    continue
+                new_value = tuple(new_fields)
+            updated_fields[field] = new_value
+        if len(updated_fields) == 0:
+            return node
         return replace(node, **updated_fields)
 
 
+# 字段种类，由 dataclass 的类型标注得出
+_NODE = 0  # Expr / Type / ...
+_NODE_LIST = 1  # list[Stmt] / list[Expr] / ...
+_RECORD = 2  # tuple[tuple[str, Expr], ...]
+
+# node class |-> ((需要遍历的字段名, 种类), ...)，str / int / list[str] 等叶子字段不在其中
+_FIELD_KINDS: dict[type, tuple[tuple[str, int], ...]] = {}
+
+
+def _field_kind(hint) -> int | None:
+    origin = get_origin(hint)
+    if origin is list:
+        (item,) = get_args(hint)
+        return _NODE_LIST if isinstance(item, type) and issubclass(item, ASTNode) else None
+    if origin is tuple:
+        return _RECORD
+    if isinstance(hint, type) and issubclass(hint, ASTNode):
+        return _NODE
+    return None
+
+
+def _field_kinds(node_cls) -> tuple[tuple[str, int], ...]:
+    kinds = _FIELD_KINDS.get(node_cls)
+    if kinds is None:
+        hints = get_type_hints(node_cls)
+        kinds = tuple(
+            (field.name, kind)
+            for field in fields(node_cls)
+            if (kind := _field_kind(hints[field.name])) is not None
+        )
+        _FIELD_KINDS[node_cls] = kinds
+    return kinds
+
+
+# node class |-> dataclass 字段名
+_FIELD_NAMES: dict[type, tuple[str, ...]] = {}
+
+
 def iter_fields(node):
-    for field in fields(node):
-        try:
-            yield field.name, getattr(node, field.name)
-        except AttributeError:
-            pass
+    names = _FIELD_NAMES.get(node.__class__)
+    if names is None:
+        names = tuple(field.name for field in fields(node))
+        _FIELD_NAMES[node.__class__] = names
+    for name in names:
+        yield name, getattr(node, name)